@@ -0,0 +1,37 @@
+"""anime_info last index
+
+Revision ID: 5d1e7b2a9c40
+Revises: f3bc7277982a
+Create Date: 2026-10-18 09:30:12.408117
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "5d1e7b2a9c40"
+down_revision: Union[str, None] = "f3bc7277982a"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_anime_info_anime_id_updated",
+        "anime_info",
+        ["anime_id", sa.text("updated DESC")],
+        unique=False,
+        schema="mytgbot",
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "ix_anime_info_anime_id_updated",
+        table_name="anime_info",
+        schema="mytgbot",
+    )
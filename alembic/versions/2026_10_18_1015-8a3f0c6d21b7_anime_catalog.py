@@ -0,0 +1,77 @@
+"""anime catalog
+
+Revision ID: 8a3f0c6d21b7
+Revises: 5d1e7b2a9c40
+Create Date: 2026-10-18 10:15:43.190254
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "8a3f0c6d21b7"
+down_revision: Union[str, None] = "5d1e7b2a9c40"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "anime",
+        sa.Column("id", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("added", sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.Column(
+            "tracked", sa.Boolean(), server_default=sa.text("true"), nullable=False
+        ),
+        sa.PrimaryKeyConstraint("id"),
+        schema="mytgbot",
+    )
+    # latest known name wins, first snapshot is the date the anime was added
+    op.execute(
+        """
+        INSERT INTO mytgbot.anime (id, name, added)
+        SELECT DISTINCT ON (anime_id)
+            anime_id,
+            anime_name,
+            min(updated) OVER (PARTITION BY anime_id)
+        FROM mytgbot.anime_info
+        ORDER BY anime_id, updated DESC
+        """
+    )
+    op.create_foreign_key(
+        "anime_info_anime_id_fkey",
+        "anime_info",
+        "anime",
+        ["anime_id"],
+        ["id"],
+        source_schema="mytgbot",
+        referent_schema="mytgbot",
+        ondelete="CASCADE",
+    )
+    op.drop_column("anime_info", "anime_name", schema="mytgbot")
+
+
+def downgrade() -> None:
+    op.add_column(
+        "anime_info",
+        sa.Column("anime_name", sa.String(), nullable=True),
+        schema="mytgbot",
+    )
+    op.execute(
+        """
+        UPDATE mytgbot.anime_info
+        SET anime_name = anime.name
+        FROM mytgbot.anime
+        WHERE anime.id = anime_info.anime_id
+        """
+    )
+    op.alter_column("anime_info", "anime_name", nullable=False, schema="mytgbot")
+    op.drop_constraint(
+        "anime_info_anime_id_fkey", "anime_info", type_="foreignkey", schema="mytgbot"
+    )
+    op.drop_table("anime", schema="mytgbot")
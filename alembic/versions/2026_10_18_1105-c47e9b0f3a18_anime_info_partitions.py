@@ -0,0 +1,150 @@
+"""anime_info partitions
+
+Revision ID: c47e9b0f3a18
+Revises: 8a3f0c6d21b7
+Create Date: 2026-10-18 11:05:21.773049
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c47e9b0f3a18"
+down_revision: Union[str, None] = "8a3f0c6d21b7"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE mytgbot.anime_info RENAME TO anime_info_old")
+    op.execute(
+        "ALTER TABLE mytgbot.anime_info_old "
+        "RENAME CONSTRAINT anime_info_pkey TO anime_info_old_pkey"
+    )
+    op.execute(
+        "ALTER TABLE mytgbot.anime_info_old "
+        "RENAME CONSTRAINT anime_info_anime_id_fkey TO anime_info_old_anime_id_fkey"
+    )
+    op.execute(
+        "ALTER INDEX mytgbot.ix_anime_info_anime_id_updated "
+        "RENAME TO ix_anime_info_old_anime_id_updated"
+    )
+
+    # primary key of partitioned table must include partition key
+    op.execute(
+        """
+        CREATE TABLE mytgbot.anime_info (
+            id INTEGER NOT NULL DEFAULT nextval('mytgbot.anime_info_id_seq'),
+            anime_id INTEGER NOT NULL,
+            rank INTEGER,
+            mean FLOAT NOT NULL,
+            users_all INTEGER NOT NULL,
+            users_scored INTEGER NOT NULL,
+            status VARCHAR NOT NULL,
+            updated TIMESTAMP WITH TIME ZONE NOT NULL,
+            CONSTRAINT anime_info_pkey PRIMARY KEY (id, updated),
+            CONSTRAINT anime_info_anime_id_fkey FOREIGN KEY (anime_id)
+                REFERENCES mytgbot.anime (id) ON DELETE CASCADE
+        ) PARTITION BY RANGE (updated)
+        """
+    )
+    op.execute(
+        "ALTER SEQUENCE mytgbot.anime_info_id_seq OWNED BY mytgbot.anime_info.id"
+    )
+    op.execute(
+        "CREATE INDEX ix_anime_info_anime_id_updated "
+        "ON mytgbot.anime_info (anime_id, updated DESC)"
+    )
+
+    # monthly partitions from the oldest snapshot up to two months ahead,
+    # later ones are created by the partitions job
+    op.execute(
+        """
+        DO $$
+        DECLARE
+            month DATE;
+        BEGIN
+            FOR month IN
+                SELECT generate_series(
+                    date_trunc('month', coalesce(
+                        (SELECT min(updated) FROM mytgbot.anime_info_old), now()
+                    ) AT TIME ZONE 'UTC'),
+                    date_trunc('month', now() AT TIME ZONE 'UTC') + interval '2 month',
+                    interval '1 month'
+                )::date
+            LOOP
+                EXECUTE format(
+                    'CREATE TABLE mytgbot.%I PARTITION OF mytgbot.anime_info '
+                    'FOR VALUES FROM (%L) TO (%L)',
+                    'anime_info_p' || to_char(month, 'YYYY_MM'),
+                    month::text || ' 00:00+00',
+                    (month + interval '1 month')::date::text || ' 00:00+00'
+                );
+            END LOOP;
+        END $$;
+        """
+    )
+
+    op.execute(
+        """
+        INSERT INTO mytgbot.anime_info
+            (id, anime_id, rank, mean, users_all, users_scored, status, updated)
+        SELECT id, anime_id, rank, mean, users_all, users_scored, status, updated
+        FROM mytgbot.anime_info_old
+        """
+    )
+    op.execute("DROP TABLE mytgbot.anime_info_old")
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE mytgbot.anime_info RENAME TO anime_info_partitioned")
+    op.execute(
+        "ALTER TABLE mytgbot.anime_info_partitioned "
+        "RENAME CONSTRAINT anime_info_pkey TO anime_info_partitioned_pkey"
+    )
+    op.execute(
+        "ALTER TABLE mytgbot.anime_info_partitioned "
+        "RENAME CONSTRAINT anime_info_anime_id_fkey "
+        "TO anime_info_partitioned_anime_id_fkey"
+    )
+    op.execute(
+        "ALTER INDEX mytgbot.ix_anime_info_anime_id_updated "
+        "RENAME TO ix_anime_info_partitioned_anime_id_updated"
+    )
+
+    op.execute(
+        """
+        CREATE TABLE mytgbot.anime_info (
+            id INTEGER NOT NULL DEFAULT nextval('mytgbot.anime_info_id_seq'),
+            anime_id INTEGER NOT NULL,
+            rank INTEGER,
+            mean FLOAT NOT NULL,
+            users_all INTEGER NOT NULL,
+            users_scored INTEGER NOT NULL,
+            status VARCHAR NOT NULL,
+            updated TIMESTAMP WITH TIME ZONE NOT NULL,
+            CONSTRAINT anime_info_pkey PRIMARY KEY (id),
+            CONSTRAINT anime_info_anime_id_fkey FOREIGN KEY (anime_id)
+                REFERENCES mytgbot.anime (id) ON DELETE CASCADE
+        )
+        """
+    )
+    op.execute(
+        "ALTER SEQUENCE mytgbot.anime_info_id_seq OWNED BY mytgbot.anime_info.id"
+    )
+    op.execute(
+        "CREATE INDEX ix_anime_info_anime_id_updated "
+        "ON mytgbot.anime_info (anime_id, updated DESC)"
+    )
+    op.execute(
+        """
+        INSERT INTO mytgbot.anime_info
+            (id, anime_id, rank, mean, users_all, users_scored, status, updated)
+        SELECT id, anime_id, rank, mean, users_all, users_scored, status, updated
+        FROM mytgbot.anime_info_partitioned
+        """
+    )
+    # partitions are dropped together with the parent table
+    op.execute("DROP TABLE mytgbot.anime_info_partitioned")
@@ -0,0 +1,99 @@
+"""anime stats rollups
+
+Revision ID: e2b64d8f5c93
+Revises: c47e9b0f3a18
+Create Date: 2026-10-18 11:40:08.552710
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e2b64d8f5c93"
+down_revision: Union[str, None] = "c47e9b0f3a18"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+STATS_TABLES = {
+    "anime_stats_daily": "(updated AT TIME ZONE 'UTC')::date",
+    "anime_stats_weekly": "date_trunc('week', updated AT TIME ZONE 'UTC')::date",
+}
+STATS_FIELDS = {
+    "mean": sa.Float,
+    "rank": sa.Integer,
+    "users_all": sa.Integer,
+    "users_scored": sa.Integer,
+}
+
+
+def upgrade() -> None:
+    for table, period_start in STATS_TABLES.items():
+        columns = []
+        for field, field_type in STATS_FIELDS.items():
+            nullable = field == "rank"
+            columns.extend(
+                [
+                    sa.Column(f"first_{field}", field_type(), nullable=nullable),
+                    sa.Column(f"last_{field}", field_type(), nullable=nullable),
+                    sa.Column(f"min_{field}", field_type(), nullable=nullable),
+                    sa.Column(f"max_{field}", field_type(), nullable=nullable),
+                    sa.Column(
+                        f"delta_{field}",
+                        field_type(),
+                        sa.Computed(f"last_{field} - first_{field}"),
+                        nullable=True,
+                    ),
+                ]
+            )
+        op.create_table(
+            table,
+            sa.Column("anime_id", sa.Integer(), nullable=False),
+            sa.Column("period_start", sa.Date(), nullable=False),
+            sa.Column("snapshots", sa.Integer(), nullable=False),
+            sa.Column("first_updated", sa.TIMESTAMP(timezone=True), nullable=False),
+            sa.Column("last_updated", sa.TIMESTAMP(timezone=True), nullable=False),
+            *columns,
+            sa.ForeignKeyConstraint(
+                ["anime_id"], ["mytgbot.anime.id"], ondelete="CASCADE"
+            ),
+            sa.PrimaryKeyConstraint("anime_id", "period_start"),
+            schema="mytgbot",
+        )
+
+        aggregates = []
+        for field in STATS_FIELDS:
+            aggregates.extend(
+                [
+                    f"(array_agg({field} ORDER BY updated))[1]",
+                    f"(array_agg({field} ORDER BY updated DESC))[1]",
+                    f"min({field})",
+                    f"max({field})",
+                ]
+            )
+        names = [
+            f"{prefix}_{field}"
+            for field in STATS_FIELDS
+            for prefix in ("first", "last", "min", "max")
+        ]
+        op.execute(
+            f"""
+            INSERT INTO mytgbot.{table} (
+                anime_id, period_start, snapshots, first_updated, last_updated,
+                {", ".join(names)}
+            )
+            SELECT
+                anime_id, {period_start}, count(*), min(updated), max(updated),
+                {", ".join(aggregates)}
+            FROM mytgbot.anime_info
+            GROUP BY 1, 2
+            """
+        )
+
+
+def downgrade() -> None:
+    for table in STATS_TABLES:
+        op.drop_table(table, schema="mytgbot")
@@ -0,0 +1,33 @@
+"""anime_info last_seen
+
+Revision ID: 1f9a4c7e0b52
+Revises: e2b64d8f5c93
+Create Date: 2026-10-18 12:10:37.915604
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "1f9a4c7e0b52"
+down_revision: Union[str, None] = "e2b64d8f5c93"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "anime_info",
+        sa.Column("last_seen", sa.TIMESTAMP(timezone=True), nullable=True),
+        schema="mytgbot",
+    )
+    op.execute("UPDATE mytgbot.anime_info SET last_seen = updated")
+    op.alter_column("anime_info", "last_seen", nullable=False, schema="mytgbot")
+
+
+def downgrade() -> None:
+    op.drop_column("anime_info", "last_seen", schema="mytgbot")
@@ -0,0 +1,70 @@
+"""anime top movers
+
+Revision ID: 7b0d2e5f8a61
+Revises: 1f9a4c7e0b52
+Create Date: 2026-10-18 13:00:54.336820
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "7b0d2e5f8a61"
+down_revision: Union[str, None] = "1f9a4c7e0b52"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # movement over the last 7 days, built from daily rollups
+    op.execute(
+        """
+        CREATE MATERIALIZED VIEW mytgbot.anime_top_movers AS
+        WITH period AS (
+            SELECT
+                anime_id,
+                (array_agg(first_rank ORDER BY period_start))[1] AS first_rank,
+                (array_agg(last_rank ORDER BY period_start DESC))[1] AS last_rank,
+                (array_agg(first_mean ORDER BY period_start))[1] AS first_mean,
+                (array_agg(last_mean ORDER BY period_start DESC))[1] AS last_mean,
+                (array_agg(first_users_all ORDER BY period_start))[1]
+                    AS first_users_all,
+                (array_agg(last_users_all ORDER BY period_start DESC))[1]
+                    AS last_users_all
+            FROM mytgbot.anime_stats_daily
+            WHERE period_start >= (now() AT TIME ZONE 'UTC')::date - 6
+            GROUP BY anime_id
+        ),
+        movement AS (
+            SELECT
+                anime_id,
+                last_rank AS rank,
+                first_rank - last_rank AS rank_climb,
+                last_mean AS mean,
+                last_mean - first_mean AS mean_delta,
+                last_users_all AS users_all,
+                last_users_all - first_users_all AS users_delta,
+                (last_users_all - first_users_all)::float
+                    / nullif(first_users_all, 0) * 100 AS users_growth
+            FROM period
+        )
+        SELECT
+            movement.*,
+            rank() OVER (ORDER BY rank_climb DESC NULLS LAST) AS rank_place,
+            rank() OVER (ORDER BY abs(mean_delta) DESC NULLS LAST) AS mean_place,
+            rank() OVER (ORDER BY users_growth DESC NULLS LAST) AS users_place,
+            now() AS refreshed
+        FROM movement
+        """
+    )
+    # unique index is required by REFRESH ... CONCURRENTLY
+    op.execute(
+        "CREATE UNIQUE INDEX ix_anime_top_movers_anime_id "
+        "ON mytgbot.anime_top_movers (anime_id)"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP MATERIALIZED VIEW mytgbot.anime_top_movers")
@@ -0,0 +1,36 @@
+"""job state
+
+Revision ID: 3c8e1d9f4a27
+Revises: 7b0d2e5f8a61
+Create Date: 2026-10-18 14:00:21.604318
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "3c8e1d9f4a27"
+down_revision: Union[str, None] = "7b0d2e5f8a61"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "job_state",
+        sa.Column("job_name", sa.String(), nullable=False),
+        sa.Column("last_run", sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.Column("next_run", sa.TIMESTAMP(timezone=True), nullable=True),
+        sa.Column("last_finished", sa.TIMESTAMP(timezone=True), nullable=True),
+        sa.Column("last_error", sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint("job_name"),
+        schema="mytgbot",
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("job_state", schema="mytgbot")
@@ -0,0 +1,57 @@
+"""job runs
+
+Revision ID: 9d4f2a6c1e58
+Revises: 3c8e1d9f4a27
+Create Date: 2026-10-18 15:00:47.193265
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "9d4f2a6c1e58"
+down_revision: Union[str, None] = "3c8e1d9f4a27"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "job_runs",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("job_name", sa.String(), nullable=False),
+        sa.Column("run_time", sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.Column("next_run", sa.TIMESTAMP(timezone=True), nullable=True),
+        sa.Column("started", sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.Column("finished", sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.Column("error", sa.String(), nullable=True),
+        sa.Column("titles", sa.Integer(), nullable=False),
+        sa.Column("failures", sa.Integer(), nullable=False),
+        sa.Column("messages", sa.Integer(), nullable=False),
+        sa.Column("mal_p50", sa.Float(), nullable=True),
+        sa.Column("mal_p95", sa.Float(), nullable=True),
+        sa.Column("mal_max", sa.Float(), nullable=True),
+        sa.Column("db_time", sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        schema="mytgbot",
+    )
+    op.create_index(
+        "ix_job_runs_job_name_started",
+        "job_runs",
+        ["job_name", sa.text("started DESC")],
+        unique=False,
+        schema="mytgbot",
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "ix_job_runs_job_name_started",
+        table_name="job_runs",
+        schema="mytgbot",
+    )
+    op.drop_table("job_runs", schema="mytgbot")
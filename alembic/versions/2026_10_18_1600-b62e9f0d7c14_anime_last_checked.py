@@ -0,0 +1,50 @@
+"""anime last checked
+
+Revision ID: b62e9f0d7c14
+Revises: 9d4f2a6c1e58
+Create Date: 2026-10-18 16:00:09.527384
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b62e9f0d7c14"
+down_revision: Union[str, None] = "9d4f2a6c1e58"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "anime",
+        sa.Column("last_status", sa.String(), nullable=True),
+        schema="mytgbot",
+    )
+    op.add_column(
+        "anime",
+        sa.Column("last_checked", sa.TIMESTAMP(timezone=True), nullable=True),
+        schema="mytgbot",
+    )
+    # latest snapshot keeps time of the latest check in last_seen
+    op.execute(
+        """
+        UPDATE mytgbot.anime AS a
+        SET last_status = l.status, last_checked = l.last_seen
+        FROM (
+            SELECT DISTINCT ON (anime_id) anime_id, status, last_seen
+            FROM mytgbot.anime_info
+            ORDER BY anime_id, updated DESC
+        ) AS l
+        WHERE l.anime_id = a.id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("anime", "last_checked", schema="mytgbot")
+    op.drop_column("anime", "last_status", schema="mytgbot")
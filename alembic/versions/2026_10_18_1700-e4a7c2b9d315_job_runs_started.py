@@ -0,0 +1,37 @@
+"""job runs started
+
+Revision ID: e4a7c2b9d315
+Revises: b62e9f0d7c14
+Create Date: 2026-10-18 17:00:41.218630
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e4a7c2b9d315"
+down_revision: Union[str, None] = "b62e9f0d7c14"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_job_runs_started",
+        "job_runs",
+        [sa.text("started DESC")],
+        unique=False,
+        schema="mytgbot",
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "ix_job_runs_started",
+        table_name="job_runs",
+        schema="mytgbot",
+    )
@@ -0,0 +1,47 @@
+# runs inside pool workers: keep it free of app imports,
+# so spawned processes don't load config, database and bot
+import io
+from datetime import datetime
+
+
+def render_history_chart(
+    title: str,
+    history: list[tuple[datetime, datetime, float | None, int | None, int | None]],
+) -> bytes:
+    import matplotlib
+
+    matplotlib.use("Agg")
+    from matplotlib import pyplot as plt
+
+    # deduplicated snapshot holds its values from updated till last_seen
+    times, means, ranks, users = [], [], [], []
+    for updated, last_seen, mean, rank, users_all in history:
+        for time in (updated, last_seen) if last_seen > updated else (updated,):
+            times.append(time)
+            means.append(mean)
+            ranks.append(rank)
+            users.append(users_all)
+
+    figure, axes = plt.subplots(3, 1, sharex=True, figsize=(8, 7), dpi=100)
+    try:
+        figure.suptitle(title)
+        for ax, values, label in zip(
+            axes, (means, ranks, users), ("Mean", "Rank", "Users all")
+        ):
+            ax.step(
+                times,
+                [value if value is not None else float("nan") for value in values],
+                where="post",
+            )
+            ax.set_ylabel(label)
+            ax.grid(True, alpha=0.3)
+        # higher place is a smaller number
+        axes[1].invert_yaxis()
+        axes[2].ticklabel_format(axis="y", style="plain", useOffset=False)
+        figure.autofmt_xdate()
+
+        buffer = io.BytesIO()
+        figure.savefig(buffer, format="png", bbox_inches="tight")
+        return buffer.getvalue()
+    finally:
+        plt.close(figure)
@@ -0,0 +1,112 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta, timezone
+from multiprocessing import get_context
+
+from cachetools import LRUCache
+
+from app.analytics._render import render_history_chart
+from app.common.config import cfg
+from app.common.utils import get_logger, levelDEBUG, levelINFO
+from app.crud import anime as crud_anime
+from app.crud import stats as crud_stats
+
+logger = get_logger(levelDEBUG if cfg.ENV == "dev" else levelINFO)
+
+CHART_RANGES = {
+    "7d": timedelta(days=7),
+    "30d": timedelta(days=30),
+    "90d": timedelta(days=90),
+    "all": None,
+}
+# longer ranges are drawn from rollups, a point per day or week is enough there
+CHART_ROLLUPS = {"30d": "daily", "90d": "daily", "all": "weekly"}
+
+
+class ChartRenderer:
+    def __init__(self) -> None:
+        self._pool: ProcessPoolExecutor | None = None
+        # key holds time of the latest snapshot, new data makes a new key
+        self.cache = LRUCache(maxsize=cfg.CHARTS_CACHE_SIZE)
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        # fallback for calls made outside of app lifespan (scripts, shell)
+        if self._pool is None:
+            self.start()
+        return self._pool
+
+    def start(self) -> None:
+        # spawned workers don't inherit event loop, db engine and bot session
+        self._pool = ProcessPoolExecutor(
+            max_workers=cfg.CHARTS_WORKERS, mp_context=get_context("spawn")
+        )
+        logger.info("Charts pool started")
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            logger.info("Charts pool closed")
+        self._pool = None
+
+    async def get_history(
+        self, anime_id: int, chart_range: str
+    ) -> list[tuple[datetime, datetime, float | None, int | None, int | None]]:
+        period = CHART_RANGES[chart_range]
+        rollup = CHART_ROLLUPS.get(chart_range)
+        if rollup is None:
+            since = datetime.now(timezone.utc) - period if period else None
+            return await crud_anime.get_anime_history(anime_id, since)
+
+        if rollup == "daily":
+            all_stats = await crud_stats.get_daily_stats(
+                anime_id, period and period.days
+            )
+        else:
+            all_stats = await crud_stats.get_weekly_stats(
+                anime_id, period and period.days // 7
+            )
+        # state at the end of every period, same tuples as snapshot history
+        return [
+            (
+                stats.last_updated,
+                stats.last_updated,
+                stats.last_mean,
+                stats.last_rank,
+                stats.last_users_all,
+            )
+            for stats in reversed(all_stats)
+        ]
+
+    async def get_chart(
+        self, anime_id: int, anime_name: str, chart_range: str, last_seen: datetime
+    ) -> bytes | None:
+        key = (anime_id, chart_range, last_seen)
+        chart = self.cache.get(key)
+        if chart is not None:
+            return chart
+
+        history = await self.get_history(anime_id, chart_range)
+        if not history:
+            return None
+
+        try:
+            chart = await asyncio.get_running_loop().run_in_executor(
+                self.pool,
+                render_history_chart,
+                f"{anime_name} ({chart_range})",
+                history,
+            )
+        except BrokenProcessPool:
+            # crashed worker breaks the whole pool, next call gets a fresh one
+            self.close()
+            raise
+
+        if self.cache.maxsize != cfg.CHARTS_CACHE_SIZE:
+            self.cache = LRUCache(maxsize=cfg.CHARTS_CACHE_SIZE)
+        self.cache[key] = chart
+        return chart
+
+
+chart_renderer = ChartRenderer()
@@ -0,0 +1,105 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+import numpy as np
+
+from app.crud import anime as crud_anime
+from app.crud import stats as crud_stats
+
+FORECAST_LOOKBACK = timedelta(days=30)
+FORECAST_HALF_LIFE_DAYS = 7.0
+FORECAST_HORIZONS_DAYS = (7, 30)
+SECONDS_IN_DAY = 60 * 60 * 24
+# centered spread of times below this share of raw sums is rounding noise
+FIT_EPSILON = 1e-12
+
+_forecast_cache: dict[str, Any] = {"key": None, "forecast": None}
+
+
+def fit_lines(
+    groups: np.ndarray, groups_count: int, x: np.ndarray, y: np.ndarray, w: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    # weighted least squares for every group at once via grouped sums,
+    # x is centered on the group mean, raw sums cancel out into noise
+    sw = np.bincount(groups, w, groups_count)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_x = np.bincount(groups, w * x, groups_count) / sw
+        mean_y = np.bincount(groups, w * y, groups_count) / sw
+    dx = x - mean_x[groups]
+    sxx = np.bincount(groups, w * dx * dx, groups_count)
+    sxy = np.bincount(groups, w * dx * y, groups_count)
+    sxx_raw = np.bincount(groups, w * x * x, groups_count)
+
+    # line needs two distinct times, a single point has no slope
+    distinct_groups = np.unique(np.column_stack([groups, x]), axis=0)[:, 0]
+    distinct = np.bincount(distinct_groups.astype(np.int64), minlength=groups_count)
+    fitted = (distinct >= 2) & (sxx > FIT_EPSILON * sxx_raw)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = np.where(fitted, sxy / sxx, np.nan)
+        intercept = np.where(sw > 0, mean_y - np.nan_to_num(slope) * mean_x, np.nan)
+    return slope, intercept
+
+
+def compute_forecast(rows: list[tuple[float | None, ...]], now: datetime) -> dict:
+    if not rows:
+        return {}
+    data = np.array(rows, dtype=np.float64)
+    anime_ids, updated, last_seen = data[:, 0], data[:, 1], data[:, 2]
+    values = data[:, 3:]
+
+    # deduplicated snapshot holds its values from updated till last_seen,
+    # so both ends of that range become points of the series
+    extended = last_seen > updated
+    anime_ids = np.concatenate([anime_ids, anime_ids[extended]])
+    times = np.concatenate([updated, last_seen[extended]])
+    values = np.concatenate([values, values[extended]])
+
+    # time in days relative to now, older points weigh less
+    x = (times - now.timestamp()) / SECONDS_IN_DAY
+    weights = np.power(0.5, -x / FORECAST_HALF_LIFE_DAYS)
+    unique_ids, groups = np.unique(anime_ids, return_inverse=True)
+    groups_count = len(unique_ids)
+
+    result = {"anime_id": unique_ids.astype(np.int64)}
+    result["points"] = np.bincount(groups, minlength=groups_count)
+    for column, field in enumerate(("rank", "users_all", "users_scored")):
+        y = values[:, column]
+        known = ~np.isnan(y)
+        slope, intercept = fit_lines(
+            groups[known], groups_count, x[known], y[known], weights[known]
+        )
+        result[f"{field}_rate"] = slope
+        for horizon in FORECAST_HORIZONS_DAYS:
+            projected = intercept + np.nan_to_num(slope) * horizon
+            if field == "rank":
+                projected = np.maximum(projected, 1)
+            result[f"{field}_{horizon}d"] = projected
+    return result
+
+
+async def get_forecast() -> list[dict[str, Any]]:
+    # recomputed only after a new refresh has landed or titles have changed
+    cache_key = (
+        await crud_stats.get_last_refresh_time(),
+        crud_anime.anime_cache.catalog_version,
+    )
+    if _forecast_cache["forecast"] is None or _forecast_cache["key"] != cache_key:
+        now = datetime.now(timezone.utc)
+        rows = await crud_stats.get_anime_series(now - FORECAST_LOOKBACK)
+        forecast = await asyncio.to_thread(compute_forecast, rows, now)
+
+        names = {anime.id: anime.name for anime in await crud_anime.get_all_anime()}
+        fields = list(forecast)
+        _forecast_cache["forecast"] = sorted(
+            (
+                {
+                    "anime_name": names.get(int(anime_id), str(int(anime_id))),
+                    **{field: forecast[field][index].item() for field in fields},
+                }
+                for index, anime_id in enumerate(forecast.get("anime_id", []))
+            ),
+            key=lambda anime_forecast: anime_forecast["anime_name"],
+        )
+        _forecast_cache["key"] = cache_key
+    return _forecast_cache["forecast"]
@@ -0,0 +1,135 @@
+import asyncio
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Any, AsyncGenerator
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from litestar import Router, get
+from litestar.exceptions import HTTPException
+from litestar.params import Parameter
+from litestar.response import Stream
+
+from app.common.config import cfg
+from app.common.utils import get_logger, levelDEBUG, levelINFO
+from app.crud import anime as crud_anime
+
+logger = get_logger(levelDEBUG if cfg.ENV == "dev" else levelINFO)
+
+EXPORT_CHUNK_SIZE = 5000
+EXPORT_FIELDS = [column.name for column in crud_anime.ANIME_INFO_COLUMNS]
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def json_default(value: Any) -> str:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+async def export_csv(id: int | None) -> AsyncGenerator[bytes, None]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    async for rows in crud_anime.stream_anime_info(id, EXPORT_CHUNK_SIZE):
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+async def export_ndjson(id: int | None) -> AsyncGenerator[bytes, None]:
+    async for rows in crud_anime.stream_anime_info(id, EXPORT_CHUNK_SIZE):
+        yield "".join(
+            json.dumps(row._asdict(), default=json_default, ensure_ascii=False) + "\n"
+            for row in rows
+        ).encode()
+
+
+class ParquetSink(io.RawIOBase):
+    # parquet footer needs absolute offsets, so position is counted separately
+    # from buffered bytes that are handed out to the response
+    def __init__(self) -> None:
+        self.chunks: list[bytes] = []
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: bytes) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def pop(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+async def export_parquet(id: int | None) -> AsyncGenerator[bytes, None]:
+    schema = pa.schema(
+        [
+            ("id", pa.int64()),
+            ("anime_id", pa.int64()),
+            ("rank", pa.int64()),
+            ("mean", pa.float64()),
+            ("users_all", pa.int64()),
+            ("users_scored", pa.int64()),
+            ("status", pa.string()),
+            ("updated", pa.timestamp("us", tz="UTC")),
+            ("last_seen", pa.timestamp("us", tz="UTC")),
+            ("anime_name", pa.string()),
+        ]
+    )
+    sink = ParquetSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        async for rows in crud_anime.stream_anime_info(id, EXPORT_CHUNK_SIZE):
+            table = pa.Table.from_pylist([row._asdict() for row in rows], schema)
+            # one row group per chunk, encoding is done off the event loop
+            await asyncio.to_thread(writer.write_table, table)
+            yield sink.pop()
+    finally:
+        writer.close()
+    yield sink.pop()
+
+
+EXPORTERS = {"csv": export_csv, "ndjson": export_ndjson, "parquet": export_parquet}
+
+
+@get("/api/anime/export")
+async def anime_export(
+    headers: dict[str, str],
+    export_format: str = Parameter(query="format", default="csv"),
+    anime_id: int | None = None,
+) -> Stream:
+    header_secret = headers.get("X-MyBot-Api-Secret-Token".lower(), "")
+    if not cfg.API_SECRET or header_secret != cfg.API_SECRET:
+        logger.error("Secrets don't match")
+        raise HTTPException(status_code=401, detail="NOT VERIFIED")
+
+    if export_format not in EXPORTERS:
+        raise HTTPException(
+            status_code=400, detail=f"Format must be one of {', '.join(EXPORTERS)}"
+        )
+    file_name = f"anime_{anime_id if anime_id is not None else 'all'}.{export_format}"
+    return Stream(
+        EXPORTERS[export_format](anime_id),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{file_name}"'},
+    )
+
+
+router = Router(path="", route_handlers=[anime_export])
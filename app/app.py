@@ -4,11 +4,19 @@ from contextlib import asynccontextmanager
 from litestar import Litestar, Request, Response
 from litestar.status_codes import HTTP_500_INTERNAL_SERVER_ERROR
 
+from app.analytics.charts import chart_renderer
+from app.api.export import router as litestar_router_export
 from app.api.webhooks import router as litestar_router
 from app.common.config import cfg
 from app.common.utils import get_logger, get_logging_config, levelDEBUG, levelINFO
+from app.crud import anime as crud_anime
 from app.db.common import _engine, check_db
+from app.db.locks import advisory_lock
+from app.db.notify import cache_listener
+from app.externals.myanimelist import mal_client
 from app.jobs.anime import anime_job
+from app.jobs.partitions import partitions_job
+from app.jobs.scheduler import scheduler
 from app.telegram.bot import bot, dp
 from app.telegram.commands import COMMANDS_TG
 from app.telegram.middlewares import AuthChatMiddleware
@@ -19,27 +27,56 @@ from app.telegram.routes.base import router as telegram_router_base
 logger = get_logger(levelDEBUG if cfg.ENV == "dev" else levelINFO)
 logging_config = get_logging_config(levelDEBUG if cfg.ENV == "dev" else levelINFO)
 
+BOT_DESCRIPTION = "mirakzen personal bot"
 
-@asynccontextmanager
-async def lifespan_function(app: Litestar) -> AsyncGenerator[None, None]:
-    await check_db(logger)
 
-    # webhook_info = await bot.get_webhook_info()
-    # if webhook_info.url != f"https://{cfg.DOMAIN}/webhooks/telegram":
+async def setup_bot() -> None:
+    webhook_url = f"https://{cfg.DOMAIN}/webhooks/telegram"
+    # secret isn't shown in webhook info, so webhook is always set, but
+    # pending updates are dropped only when it moves to another url
+    webhook_info = await bot.get_webhook_info()
     await bot.set_webhook(
-        url=f"https://{cfg.DOMAIN}/webhooks/telegram",
+        url=webhook_url,
         secret_token=cfg.TELEGRAM_SECRET,
-        drop_pending_updates=True,
+        drop_pending_updates=webhook_info.url != webhook_url,
     )
+    if await bot.get_my_commands() != COMMANDS_TG:
+        await bot.set_my_commands(COMMANDS_TG)
+    if (await bot.get_my_description()).description != BOT_DESCRIPTION:
+        await bot.set_my_description(BOT_DESCRIPTION)
+
+
+@asynccontextmanager
+async def lifespan_function(app: Litestar) -> AsyncGenerator[None, None]:
+    await check_db(logger)
+    mal_client.start()
+    chart_renderer.start()
+    await cache_listener.start()
+    try:
+        await crud_anime.warm_cache()
+    except Exception as e:
+        logger.error(f"Failed to warm anime cache: {str(e)}")
 
     dp.include_router(telegram_router_base)
     dp.include_router(telegram_router_admin)
     dp.include_router(telegram_router_anime)
     dp.message.middleware(AuthChatMiddleware())
-    await bot.set_my_commands(COMMANDS_TG)
-    await bot.set_my_description("mirakzen personal bot")
 
-    await anime_job.start()
+    # bot setup is done by one instance and only when something differs
+    async with advisory_lock("startup") as acquired:
+        if acquired:
+            await setup_bot()
+            # partitions for incoming snapshots must exist before the first anime run
+            try:
+                await partitions_job.loop_task()
+            except Exception as e:
+                logger.error(f"Failed to maintain anime_info partitions: {str(e)}")
+        else:
+            logger.info("Bot setup is done by another instance")
+
+    scheduler.register(partitions_job)
+    scheduler.register(anime_job)
+    await scheduler.start()
 
     if cfg.ENV != "dev":
         await bot.send_message(chat_id=cfg.OWNER_ID, text="ADMIN MESSAGE\nBOT STARTED")
@@ -47,10 +84,14 @@ async def lifespan_function(app: Litestar) -> AsyncGenerator[None, None]:
     try:
         yield
     finally:
+        # running jobs still use bot, db and MAL client
+        await scheduler.stop()
+
+        await cache_listener.stop()
         await bot.session.close()
         await _engine.dispose()
-
-        await anime_job.stop()
+        await mal_client.close()
+        chart_renderer.close()
 
 
 def internal_server_error_handler(request: Request, exc: Exception) -> Response:
@@ -62,7 +103,7 @@ def internal_server_error_handler(request: Request, exc: Exception) -> Response:
 
 
 app = Litestar(
-    [litestar_router],
+    [litestar_router, litestar_router_export],
     lifespan=[lifespan_function],
     logging_config=logging_config,
     exception_handlers={
@@ -7,6 +7,7 @@ import requests
 import yaml
 from aiofile import async_open
 
+from app.common.cron import CronExpression
 from app.common.utils import (
     disable_unnecessary_loggers,
     get_args,
@@ -167,16 +168,53 @@ class ConfigManager:
         # anime update
         anime_data = self.secrets_data.get(f"{self.ENV}/jobs/anime")
         try:
-            UPDATE_TYPE = anime_data["type"]
-            if UPDATE_TYPE == "delay":
+            MODE = anime_data.get("mode", "batch")
+            if MODE not in ("batch", "spread", "adaptive"):
+                raise
+            # adaptive mode polls by status intervals and needs no schedule
+            UPDATE_TYPE = anime_data.get("type")
+            if UPDATE_TYPE is None and MODE == "adaptive":
+                pass
+            elif UPDATE_TYPE == "delay":
                 anime_data["delay_value"]
                 DELAY_UNIT = anime_data["delay_unit"]
                 if DELAY_UNIT not in ("minutes", "hours", "days"):
                     raise
             elif UPDATE_TYPE == "update_at":
                 time.fromisoformat(f"{anime_data['update_at']}:00")
+            elif UPDATE_TYPE == "cron":
+                CronExpression(anime_data["cron"])
             else:
                 raise
+            JITTER = anime_data.get("jitter", 0)
+            if not isinstance(JITTER, (int, float)) or JITTER < 0:
+                raise
+            CONCURRENCY = anime_data.get("concurrency", 4)
+            if not isinstance(CONCURRENCY, int) or CONCURRENCY < 1:
+                raise
+            # spread_tick is the key from before adaptive mode
+            TICK = anime_data.get("tick", anime_data.get("spread_tick", 60))
+            if not isinstance(TICK, (int, float)) or TICK <= 0:
+                raise
+            adaptive_data = anime_data.get("adaptive") or {}
+            MIN_INTERVAL = adaptive_data.get("min_interval", 900)
+            MAX_INTERVAL = adaptive_data.get("max_interval", 86400)
+            if not 0 < MIN_INTERVAL <= MAX_INTERVAL:
+                raise
+            for value in (
+                *adaptive_data.get("statuses", {}).values(),
+                adaptive_data.get("growth_unit", 0.005),
+                adaptive_data.get("window_days", 7),
+            ):
+                if not isinstance(value, (int, float)) or value <= 0:
+                    raise
+            RETENTION_MONTHS = anime_data.get("retention_months")
+            if RETENTION_MONTHS is not None and (
+                not isinstance(RETENTION_MONTHS, int) or RETENTION_MONTHS < 0
+            ):
+                raise
+            if anime_data.get("retention_mode", "drop") not in ("drop", "detach"):
+                raise
         except Exception:
             no_secrets.append(f"{self.ENV}/jobs/anime")
 
@@ -213,6 +251,20 @@ class ConfigManager:
         self.MAL_API = mal_data["api_url"]
         self.MAL_HEADER = mal_data["header"]
         self.MAL_CLIENT_ID = mal_data["client_id"]
+        self.MAL_MAX_CONNECTIONS = mal_data.get("max_connections", 10)
+        self.MAL_MAX_KEEPALIVE = mal_data.get("max_keepalive", 5)
+        self.MAL_KEEPALIVE_EXPIRY = mal_data.get("keepalive_expiry", 30)
+        self.MAL_HTTP2 = mal_data.get("http2", False)
+        self.MAL_TIMEOUT = mal_data.get("timeout", 10)
+        self.MAL_RATE_LIMIT = mal_data.get("rate_limit", 2)
+        self.MAL_RATE_BURST = mal_data.get("rate_burst", 4)
+        self.MAL_CACHE_TTL = mal_data.get("cache_ttl", 60)
+        self.MAL_CACHE_SIZE = mal_data.get("cache_size", 1024)
+        self.MAL_RETRIES = mal_data.get("retries", 3)
+        self.MAL_BACKOFF_BASE = mal_data.get("backoff_base", 1)
+        self.MAL_BACKOFF_MAX = mal_data.get("backoff_max", 30)
+        self.MAL_BREAKER_THRESHOLD = mal_data.get("breaker_threshold", 5)
+        self.MAL_BREAKER_COOLDOWN = mal_data.get("breaker_cooldown", 300)
 
         # telegram
         telegram_data = self.secrets_data.get(f"{self.ENV}/telegram")
@@ -222,10 +274,33 @@ class ConfigManager:
 
         # anime update
         anime_data = self.secrets_data.get(f"{self.ENV}/jobs/anime")
-        self.ANIME_UPDATE_TYPE = anime_data["type"]
+        self.ANIME_UPDATE_TYPE = anime_data.get("type")
         self.ANIME_UPDATE_DELAY_VALUE = anime_data.get("delay_value")
         self.ANIME_UPDATE_DELAY_UNIT = anime_data.get("delay_unit")
         self.ANIME_UPDATE_AT = anime_data.get("update_at")
+        self.ANIME_UPDATE_CRON = anime_data.get("cron")
+        self.ANIME_UPDATE_JITTER = anime_data.get("jitter", 0)
+        self.ANIME_UPDATE_CATCH_UP = anime_data.get("catch_up", True)
+        self.ANIME_UPDATE_CONCURRENCY = anime_data.get("concurrency", 4)
+        self.ANIME_UPDATE_MODE = anime_data.get("mode", "batch")
+        self.ANIME_UPDATE_TICK = anime_data.get(
+            "tick", anime_data.get("spread_tick", 60)
+        )
+        self.ANIME_UPDATE_DEDUP = anime_data.get("dedup", False)
+        self.ANIME_PARTITIONS_AHEAD = anime_data.get("partitions_ahead", 2)
+        self.ANIME_RETENTION_MONTHS = anime_data.get("retention_months")
+        self.ANIME_RETENTION_MODE = anime_data.get("retention_mode", "drop")
+        # adaptive mode: base interval by status, shortened by users growth
+        adaptive_data = anime_data.get("adaptive") or {}
+        self.ANIME_ADAPTIVE_MIN_INTERVAL = adaptive_data.get("min_interval", 900)
+        self.ANIME_ADAPTIVE_MAX_INTERVAL = adaptive_data.get("max_interval", 86400)
+        self.ANIME_ADAPTIVE_STATUSES = {
+            "currently_airing": 3600,
+            "not_yet_aired": 21600,
+            "finished_airing": 43200,
+        } | adaptive_data.get("statuses", {})
+        self.ANIME_ADAPTIVE_GROWTH_UNIT = adaptive_data.get("growth_unit", 0.005)
+        self.ANIME_ADAPTIVE_WINDOW_DAYS = adaptive_data.get("window_days", 7)
 
         # notifications
         notifications_data = self.secrets_data.get(f"{self.ENV}/notifications")
@@ -233,5 +308,14 @@ class ConfigManager:
         self.NOTIFICATIONS_SECRET_GET = notifications_data["secret_get"]
         self.NOTIFICATIONS_ALLOWED = notifications_data["allowed"]
 
+        # api: optional, export endpoints are disabled without secret
+        api_data = self.secrets_data.get(f"{self.ENV}/api") or {}
+        self.API_SECRET = api_data.get("secret")
+
+        # charts: optional, rendered in a pool of worker processes
+        charts_data = self.secrets_data.get(f"{self.ENV}/charts") or {}
+        self.CHARTS_WORKERS = charts_data.get("workers", 2)
+        self.CHARTS_CACHE_SIZE = charts_data.get("cache_size", 64)
+
 
 cfg = ConfigManager()
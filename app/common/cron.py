@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta
+
+# minute, hour, day of month, month, day of week (0 or 7 is sunday)
+CRON_FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+CRON_SEARCH_DAYS = 366 * 5
+
+
+def parse_cron_field(value: str, low: int, high: int) -> set[int]:
+    result = set()
+    for part in value.split(","):
+        part_range, _, step = part.partition("/")
+        step = int(step) if step else 1
+        if part_range == "*":
+            start, end = low, high
+        elif "-" in part_range:
+            start, end = map(int, part_range.split("-", 1))
+        else:
+            start = int(part_range)
+            end = high if step > 1 else start
+        if step < 1 or start < low or end > high or start > end:
+            raise ValueError(f"Wrong cron field: {value}")
+        result.update(range(start, end + 1, step))
+    return result
+
+
+class CronExpression:
+    # standard 5 fields in UTC, day of month and day of week are OR-ed
+    # when both are restricted, like in cron itself
+    def __init__(self, expression: str) -> None:
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression must have 5 fields: {expression}")
+        self.expression = expression
+        minutes, hours, days, months, weekdays = (
+            parse_cron_field(field, low, high)
+            for field, (low, high) in zip(fields, CRON_FIELDS)
+        )
+        self.minutes = sorted(minutes)
+        self.hours = sorted(hours)
+        self.days = days
+        self.months = months
+        self.weekdays = {weekday % 7 for weekday in weekdays}
+        self.any_day = fields[2] == "*"
+        self.any_weekday = fields[4] == "*"
+
+    def __repr__(self) -> str:
+        return f"CronExpression({self.expression!r})"
+
+    def is_day_matched(self, moment: datetime) -> bool:
+        if moment.month not in self.months:
+            return False
+        day_matched = moment.day in self.days
+        weekday_matched = (moment.weekday() + 1) % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day_matched and weekday_matched
+        return day_matched or weekday_matched
+
+    def get_next(self, moment: datetime) -> datetime:
+        # first matching minute strictly after moment
+        moment = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        for _ in range(CRON_SEARCH_DAYS):
+            if self.is_day_matched(moment):
+                for hour in self.hours:
+                    if hour < moment.hour:
+                        continue
+                    for minute in self.minutes:
+                        if hour == moment.hour and minute < moment.minute:
+                            continue
+                        return moment.replace(hour=hour, minute=minute)
+            moment = moment.replace(hour=0, minute=0) + timedelta(days=1)
+        raise ValueError(f"No time matches cron expression: {self.expression}")
+
+    def get_previous(self, moment: datetime) -> datetime:
+        # latest matching minute not after moment
+        moment = moment.replace(second=0, microsecond=0)
+        for _ in range(CRON_SEARCH_DAYS):
+            if self.is_day_matched(moment):
+                for hour in reversed(self.hours):
+                    if hour > moment.hour:
+                        continue
+                    for minute in reversed(self.minutes):
+                        if hour == moment.hour and minute > moment.minute:
+                            continue
+                        return moment.replace(hour=hour, minute=minute)
+            moment = moment.replace(hour=23, minute=59) - timedelta(days=1)
+        raise ValueError(f"No time matches cron expression: {self.expression}")
@@ -1,6 +1,8 @@
 import getopt
 import logging
+import re
 import sys
+from datetime import timedelta
 from types import SimpleNamespace
 
 from litestar.logging import LoggingConfig
@@ -9,6 +11,9 @@ from litestar.logging import LoggingConfig
 levelDEBUG = logging.DEBUG
 levelINFO = logging.INFO
 FORMAT = "%(levelname)-8s\t%(asctime)s\t\t%(message)s"
+PERIOD_PATTERN = re.compile(r"^(\d+)([hdw])$")
+PERIOD_UNITS = {"h": "hours", "d": "days", "w": "weeks"}
+MESSAGE_LIMIT = 4000
 
 
 def get_args() -> SimpleNamespace:
@@ -46,3 +51,19 @@ def disable_unnecessary_loggers() -> None:
 
     aiogram_event_logger = logging.getLogger("aiogram.event")
     aiogram_event_logger.setLevel(logging.CRITICAL)
+
+
+def get_period(value: str) -> timedelta | None:
+    match = PERIOD_PATTERN.match(value.strip().lower())
+    if not match or int(match[1]) == 0:
+        return None
+    return timedelta(**{PERIOD_UNITS[match[2]]: int(match[1])})
+
+
+def get_message_chunks(lines: list[str], limit: int = MESSAGE_LIMIT) -> list[str]:
+    chunks = [""]
+    for line in lines:
+        if chunks[-1] and len(chunks[-1]) + len(line) + 1 > limit:
+            chunks.append("")
+        chunks[-1] += f"\n{line}" if chunks[-1] else line
+    return chunks
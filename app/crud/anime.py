@@ -1,22 +1,180 @@
-from datetime import datetime
+from datetime import datetime, timezone
+from operator import attrgetter, itemgetter
+from typing import Any, AsyncGenerator, NamedTuple
 
-from sqlalchemy import delete, desc, insert, select, update
+from sqlalchemy import Row, delete, desc, func, insert, select, true, update
 
+from app.crud import stats as crud_stats
 from app.db.common import async_session
-from app.db.models import AnimeInfo
+from app.db.models import Anime, AnimeInfo
+from app.db.notify import cache_listener, notify_cache
 
+ANIME_INFO_COLUMNS = (*AnimeInfo.__table__.columns, Anime.name.label("anime_name"))
+DEDUP_FIELDS = ("rank", "mean", "users_all", "users_scored", "status")
+get_dedup_values = attrgetter(*DEDUP_FIELDS)
+get_new_dedup_values = itemgetter(*DEDUP_FIELDS)
 
-async def get_all_anime() -> list[AnimeInfo]:
+
+class AnimeRecord(NamedTuple):
+    id: int
+    name: str
+    tracked: bool
+
+
+class AnimeCheck(NamedTuple):
+    # state of the latest refresh kept in catalog, no history is read for it
+    id: int
+    last_status: str | None
+    last_checked: datetime | None
+
+
+class AnimeSnapshot(NamedTuple):
+    # fields follow ANIME_INFO_COLUMNS, rows are mapped by position
+    id: int
+    anime_id: int
+    rank: int | None
+    mean: float
+    users_all: int
+    users_scored: int
+    status: str
+    updated: datetime
+    last_seen: datetime
+    anime_name: str
+
+
+class AnimeCache:
+    # latest snapshots and catalog are kept in memory, writes of this instance
+    # update them and writes of other instances come as cache events
+    def __init__(self) -> None:
+        self.last_infos: dict[int, AnimeSnapshot] = {}
+        # status of the latest snapshot, kept when the snapshot is dropped
+        self.statuses: dict[int, str] = {}
+        # status of the latest snapshot -> titles, None holds all of them
+        self.catalogs: dict[str | None, list[AnimeRecord]] = {}
+        # titles of the full catalog by id, filled along with it
+        self.titles: dict[int, AnimeRecord] = {}
+        self.catalog_version = 0
+        # bumped by every change, reads started before it don't store results
+        self.generation = 0
+
+    @property
+    def enabled(self) -> bool:
+        # missed events can't be told apart, so nothing is cached without them
+        return cache_listener.listening
+
+    def invalidate_catalog(self) -> None:
+        self.catalogs.clear()
+        self.titles.clear()
+        self.catalog_version += 1
+
+    def set_status(self, anime_id: int, status: str) -> None:
+        # catalogs filtered by status change only with written snapshots
+        if self.statuses.get(anime_id) != status:
+            self.invalidate_catalog()
+        self.statuses[anime_id] = status
+
+    def set_last_info(self, last_info: AnimeSnapshot, generation: int) -> None:
+        if self.enabled and generation == self.generation:
+            self.last_infos[last_info.anime_id] = last_info
+            self.statuses[last_info.anime_id] = last_info.status
+
+    def write_last_info(self, last_info: AnimeSnapshot) -> None:
+        # snapshot committed by this instance
+        self.generation += 1
+        self.set_status(last_info.anime_id, last_info.status)
+        if self.enabled:
+            self.last_infos[last_info.anime_id] = last_info
+
+    def drop_last_infos(self, statuses: list[tuple[int, str]]) -> None:
+        # snapshots written without their full record here, read again on use
+        self.generation += 1
+        for anime_id, status in statuses:
+            self.last_infos.pop(anime_id, None)
+            self.set_status(anime_id, status)
+
+    def drop_titles(self, anime_ids: list[int]) -> None:
+        # names, tracking or the titles themselves changed
+        self.generation += 1
+        for anime_id in anime_ids:
+            self.last_infos.pop(anime_id, None)
+            self.statuses.pop(anime_id, None)
+        self.invalidate_catalog()
+
+    def clear(self) -> None:
+        self.generation += 1
+        self.last_infos.clear()
+        self.statuses.clear()
+        self.invalidate_catalog()
+
+
+anime_cache = AnimeCache()
+cache_listener.subscribe(
+    {
+        "snapshots": anime_cache.drop_last_infos,
+        "titles": anime_cache.drop_titles,
+        "reset": lambda _: anime_cache.clear(),
+    },
+    anime_cache.clear,
+)
+
+
+async def warm_cache(broadcast: bool = False) -> None:
+    # with broadcast other instances drop their caches too
+    if broadcast:
+        async with async_session() as session, session.begin():
+            await notify_cache(session, "reset", [])
+    anime_cache.clear()
+    await get_all_last_info()
+    await get_all_anime()
+
+
+async def get_all_anime(status: str | None = None) -> list[AnimeRecord]:
+    if anime_cache.enabled and status in anime_cache.catalogs:
+        return list(anime_cache.catalogs[status])
+
+    if not anime_cache.enabled:
+        # pages and forecast built on uncached catalog aren't reused either
+        anime_cache.invalidate_catalog()
+    version = anime_cache.catalog_version
+    query = select(Anime.id, Anime.name, Anime.tracked).order_by(Anime.added)
+    if status is not None:
+        # one index lookup of the latest snapshot per title
+        query = query.where(
+            select(AnimeInfo.status)
+            .where(AnimeInfo.anime_id == Anime.id)
+            .order_by(desc(AnimeInfo.updated))
+            .limit(1)
+            .scalar_subquery()
+            == status
+        )
     async with async_session() as session, session.begin():
-        all_anime = (
+        all_anime = list(map(AnimeRecord._make, await session.execute(query)))
+    if anime_cache.enabled and version == anime_cache.catalog_version:
+        anime_cache.catalogs[status] = all_anime
+        if status is None:
+            anime_cache.titles = {anime.id: anime for anime in all_anime}
+    return list(all_anime)
+
+
+async def get_catalog_anime(id: int) -> AnimeRecord | None:
+    # answered from the cached catalog, tracking changes invalidate it
+    if anime_cache.enabled and None in anime_cache.catalogs:
+        return anime_cache.titles.get(id)
+    all_anime = await get_all_anime()
+    return next((anime for anime in all_anime if anime.id == id), None)
+
+
+async def get_anime(id: int) -> AnimeRecord | None:
+    async with async_session() as session, session.begin():
+        anime = (
             await session.execute(
-                select(AnimeInfo.anime_id, AnimeInfo.anime_name).distinct()
+                select(Anime.id, Anime.name, Anime.tracked).where(Anime.id == id)
             )
-        ).fetchall()
-        return [{"id": anime[0], "name": anime[1]} for anime in all_anime]
+        ).first()
+        return AnimeRecord._make(anime) if anime else None
 
 
-async def add_anime_info(
+async def add_anime(
     id: int,
     name: str,
     rank: int,
@@ -26,40 +184,324 @@ async def add_anime_info(
     status: str,
     updated: datetime,
 ) -> None:
+    anime_info = {
+        "anime_id": id,
+        "rank": rank,
+        "mean": mean,
+        "users_all": users_all,
+        "users_scored": users_scored,
+        "status": status,
+        "updated": updated,
+    }
     async with async_session() as session, session.begin():
         await session.execute(
-            insert(AnimeInfo).values(
-                anime_id=id,
-                anime_name=name,
-                rank=rank,
-                mean=mean,
-                users_all=users_all,
-                users_scored=users_scored,
-                status=status,
-                updated=updated,
+            insert(Anime).values(
+                id=id,
+                name=name,
+                added=updated,
+                last_status=status,
+                last_checked=updated,
+            )
+        )
+        info_id = await session.scalar(
+            insert(AnimeInfo)
+            .values(**anime_info, last_seen=updated)
+            .returning(AnimeInfo.id)
+        )
+        await crud_stats.update_stats(session, [anime_info])
+        await notify_cache(session, "snapshots", [(id, status)])
+
+    anime_cache.write_last_info(
+        AnimeSnapshot(id=info_id, **anime_info, last_seen=updated, anime_name=name)
+    )
+
+
+async def add_anime_info(
+    id: int,
+    rank: int,
+    mean: float,
+    users_all: int,
+    users_scored: int,
+    status: str,
+    updated: datetime,
+    last_info: AnimeSnapshot | None = None,
+) -> None:
+    await add_anime_infos(
+        [
+            {
+                "anime_id": id,
+                "rank": rank,
+                "mean": mean,
+                "users_all": users_all,
+                "users_scored": users_scored,
+                "status": status,
+                "updated": updated,
+            }
+        ],
+        {id: last_info} if last_info else None,
+    )
+
+
+def is_same_info(last_info: AnimeSnapshot, anime_info: dict[str, Any]) -> bool:
+    # rows are extended only inside one monthly partition,
+    # so retention never drops the latest snapshot of a title
+    last_updated = last_info.updated.astimezone(timezone.utc)
+    updated = anime_info["updated"].astimezone(timezone.utc)
+    if (last_updated.year, last_updated.month) != (updated.year, updated.month):
+        return False
+    return get_dedup_values(last_info) == get_new_dedup_values(anime_info)
+
+
+async def add_anime_infos(
+    anime_infos: list[dict[str, Any]],
+    last_infos: dict[int, AnimeSnapshot] | None = None,
+) -> None:
+    # with last_infos given, unchanged snapshots only bump last_seen of previous row
+    if not anime_infos:
+        return
+
+    same_infos = {}
+    for anime_info in anime_infos:
+        last_info = (last_infos or {}).get(anime_info["anime_id"])
+        if last_info and is_same_info(last_info, anime_info):
+            same_infos[anime_info["anime_id"]] = last_info
+
+    # list of parameters is sent as one executemany in single transaction,
+    # rollups are updated in the same transaction
+    info_ids = {}
+    async with async_session() as session, session.begin():
+        if same_infos:
+            # given snapshot may be stale, only the latest row can be extended,
+            # rows before the oldest given one are pruned with their partitions
+            since = min(last_info.updated for last_info in same_infos.values())
+            latest_updated = dict(
+                (
+                    await session.execute(
+                        select(AnimeInfo.anime_id, func.max(AnimeInfo.updated))
+                        .where(
+                            AnimeInfo.anime_id.in_(same_infos),
+                            AnimeInfo.updated >= since,
+                        )
+                        .group_by(AnimeInfo.anime_id)
+                    )
+                ).all()
             )
+            same_infos = {
+                anime_id: last_info
+                for anime_id, last_info in same_infos.items()
+                if latest_updated.get(anime_id) == last_info.updated
+            }
+        new_infos = []
+        seen_infos = {}
+        for anime_info in anime_infos:
+            last_info = same_infos.get(anime_info["anime_id"])
+            if last_info:
+                seen_infos[last_info.anime_id] = {
+                    "id": last_info.id,
+                    "updated": last_info.updated,
+                    "last_seen": anime_info["updated"],
+                }
+            else:
+                new_infos.append({**anime_info, "last_seen": anime_info["updated"]})
+
+        if new_infos:
+            info_ids = dict(
+                (
+                    await session.execute(
+                        insert(AnimeInfo).returning(AnimeInfo.anime_id, AnimeInfo.id),
+                        new_infos,
+                    )
+                ).all()
+            )
+        if seen_infos:
+            await session.execute(update(AnimeInfo), list(seen_infos.values()))
+        await session.execute(
+            update(Anime),
+            [
+                {
+                    "id": anime_info["anime_id"],
+                    "last_status": anime_info["status"],
+                    "last_checked": anime_info["updated"],
+                }
+                for anime_info in anime_infos
+            ],
+        )
+        await crud_stats.update_stats(session, anime_infos)
+        await notify_cache(
+            session,
+            "snapshots",
+            [
+                (anime_info["anime_id"], anime_info["status"])
+                for anime_info in anime_infos
+            ],
         )
 
+    # cached snapshots are changed only after commit,
+    # name isn't known without cached snapshot, it's read on next use
+    dropped_infos = []
+    for new_info in new_infos:
+        anime_id = new_info["anime_id"]
+        cached_info = anime_cache.last_infos.get(anime_id)
+        if cached_info:
+            anime_cache.write_last_info(
+                AnimeSnapshot(
+                    **{
+                        **new_info,
+                        "id": info_ids[anime_id],
+                        "anime_name": cached_info.anime_name,
+                    }
+                )
+            )
+        else:
+            dropped_infos.append((anime_id, new_info["status"]))
+    for anime_id, seen_info in seen_infos.items():
+        cached_info = anime_cache.last_infos.get(anime_id)
+        if cached_info and cached_info.id == seen_info["id"]:
+            anime_cache.write_last_info(
+                cached_info._replace(last_seen=seen_info["last_seen"])
+            )
+        else:
+            dropped_infos.append((anime_id, same_infos[anime_id].status))
+    anime_cache.drop_last_infos(dropped_infos)
+
 
 async def delete_anime(id: int) -> None:
+    # snapshots are removed by ON DELETE CASCADE
     async with async_session() as session, session.begin():
-        await session.execute(delete(AnimeInfo).where(AnimeInfo.anime_id == id))
+        await session.execute(delete(Anime).where(Anime.id == id))
+        await notify_cache(session, "titles", [id])
+    anime_cache.drop_titles([id])
 
 
 async def rename_anime(id: int, new_name: str) -> None:
+    async with async_session() as session, session.begin():
+        await session.execute(update(Anime).where(Anime.id == id).values(name=new_name))
+        await notify_cache(session, "titles", [id])
+    anime_cache.drop_titles([id])
+
+
+async def set_tracked(id: int, tracked: bool) -> None:
+    # untracked titles are kept with their history, job only skips them
     async with async_session() as session, session.begin():
         await session.execute(
-            update(AnimeInfo)
-            .where(AnimeInfo.anime_id == id)
-            .values(anime_name=new_name)
+            update(Anime).where(Anime.id == id).values(tracked=tracked)
         )
+        await notify_cache(session, "titles", [id])
+    anime_cache.drop_titles([id])
+
 
+async def get_last_info(id: int) -> AnimeSnapshot | None:
+    # records are immutable, cached ones are handed out as is
+    if anime_cache.enabled and id in anime_cache.last_infos:
+        return anime_cache.last_infos[id]
 
-async def get_last_info(id: int) -> AnimeInfo:
+    generation = anime_cache.generation
     async with async_session() as session, session.begin():
-        return await session.scalar(
-            select(AnimeInfo)
-            .where(AnimeInfo.anime_id == id)
-            .order_by(desc(AnimeInfo.updated))
-            .limit(1)
+        last_info = (
+            await session.execute(
+                select(*ANIME_INFO_COLUMNS)
+                .join(Anime, Anime.id == AnimeInfo.anime_id)
+                .where(AnimeInfo.anime_id == id)
+                .order_by(desc(AnimeInfo.updated))
+                .limit(1)
+            )
+        ).first()
+    if not last_info:
+        return None
+    last_info = AnimeSnapshot._make(last_info)
+    anime_cache.set_last_info(last_info, generation)
+    return last_info
+
+
+async def get_all_last_info(tracked_only: bool = False) -> list[AnimeSnapshot]:
+    query = (
+        select(*ANIME_INFO_COLUMNS)
+        .join(Anime, Anime.id == AnimeInfo.anime_id)
+        .distinct(AnimeInfo.anime_id)
+        .order_by(AnimeInfo.anime_id, desc(AnimeInfo.updated))
+    )
+    if tracked_only:
+        query = query.where(Anime.tracked)
+    generation = anime_cache.generation
+    async with async_session() as session, session.begin():
+        all_last_info = list(map(AnimeSnapshot._make, await session.execute(query)))
+    # bulk reads are always fresh and refresh cached snapshots on the way
+    for last_info in all_last_info:
+        anime_cache.set_last_info(last_info, generation)
+    return all_last_info
+
+
+async def get_anime_checks() -> list[AnimeCheck]:
+    async with async_session() as session, session.begin():
+        return list(
+            map(
+                AnimeCheck._make,
+                await session.execute(
+                    select(Anime.id, Anime.last_status, Anime.last_checked).where(
+                        Anime.tracked
+                    )
+                ),
+            )
         )
+
+
+async def get_last_infos(ids: list[int]) -> list[AnimeSnapshot]:
+    # latest row of every title is one index lookup, history isn't scanned
+    latest = (
+        select(*AnimeInfo.__table__.columns)
+        .where(AnimeInfo.anime_id == Anime.id)
+        .order_by(desc(AnimeInfo.updated))
+        .limit(1)
+        .lateral()
+    )
+    query = (
+        select(*latest.c, Anime.name.label("anime_name"))
+        .select_from(Anime)
+        .join(latest, true())
+        .where(Anime.id.in_(ids))
+    )
+    generation = anime_cache.generation
+    async with async_session() as session, session.begin():
+        all_last_info = list(map(AnimeSnapshot._make, await session.execute(query)))
+    for last_info in all_last_info:
+        anime_cache.set_last_info(last_info, generation)
+    return all_last_info
+
+
+async def get_anime_history(
+    id: int, since: datetime | None
+) -> list[tuple[datetime, datetime, float | None, int | None, int | None]]:
+    # plain tuples, they are pickled to chart workers
+    query = (
+        select(
+            AnimeInfo.updated,
+            AnimeInfo.last_seen,
+            AnimeInfo.mean,
+            AnimeInfo.rank,
+            AnimeInfo.users_all,
+        )
+        .where(AnimeInfo.anime_id == id)
+        .order_by(AnimeInfo.updated)
+    )
+    if since is not None:
+        query = query.where(AnimeInfo.last_seen >= since)
+    async with async_session() as session, session.begin():
+        return [tuple(row) for row in (await session.execute(query)).all()]
+
+
+async def stream_anime_info(
+    id: int | None, chunk_size: int
+) -> AsyncGenerator[list[Row], None]:
+    # server side cursor, only one chunk of rows is held in memory
+    query = (
+        select(*ANIME_INFO_COLUMNS)
+        .join(Anime, Anime.id == AnimeInfo.anime_id)
+        .order_by(AnimeInfo.anime_id, AnimeInfo.updated)
+        .execution_options(yield_per=chunk_size)
+    )
+    if id is not None:
+        query = query.where(AnimeInfo.anime_id == id)
+    async with async_session() as session, session.begin():
+        result = await session.stream(query)
+        async for rows in result.partitions():
+            yield rows
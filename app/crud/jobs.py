@@ -0,0 +1,90 @@
+from datetime import datetime
+from typing import Any, NamedTuple
+
+from sqlalchemy import delete, desc, select, update
+from sqlalchemy.dialects.postgresql import insert
+
+from app.db.common import async_session
+from app.db.models import JobRun, JobState
+
+
+class JobStateRecord(NamedTuple):
+    job_name: str
+    last_run: datetime
+    next_run: datetime | None
+    last_finished: datetime | None
+    last_error: str | None
+
+
+class JobRunRecord(NamedTuple):
+    id: int
+    job_name: str
+    run_time: datetime
+    next_run: datetime | None
+    started: datetime
+    finished: datetime
+    error: str | None
+    titles: int
+    failures: int
+    messages: int
+    mal_p50: float | None
+    mal_p95: float | None
+    mal_max: float | None
+    db_time: float
+
+
+async def get_job_state(job_name: str) -> JobStateRecord | None:
+    async with async_session() as session, session.begin():
+        job_state = (
+            await session.execute(
+                select(*JobState.__table__.columns).where(JobState.job_name == job_name)
+            )
+        ).first()
+        return JobStateRecord._make(job_state) if job_state else None
+
+
+async def set_job_run(
+    job_name: str, last_run: datetime, next_run: datetime | None
+) -> None:
+    query = insert(JobState).values(
+        job_name=job_name, last_run=last_run, next_run=next_run
+    )
+    async with async_session() as session, session.begin():
+        await session.execute(
+            query.on_conflict_do_update(
+                index_elements=[JobState.job_name],
+                set_={"last_run": last_run, "next_run": next_run},
+            )
+        )
+
+
+async def set_job_finished(
+    job_name: str, last_finished: datetime, last_error: str | None
+) -> None:
+    async with async_session() as session, session.begin():
+        await session.execute(
+            update(JobState)
+            .where(JobState.job_name == job_name)
+            .values(last_finished=last_finished, last_error=last_error)
+        )
+
+
+async def add_job_run(job_run: dict[str, Any]) -> None:
+    async with async_session() as session, session.begin():
+        await session.execute(insert(JobRun).values(**job_run))
+
+
+async def get_job_runs(limit: int, job_name: str | None = None) -> list[JobRunRecord]:
+    query = (
+        select(*JobRun.__table__.columns).order_by(desc(JobRun.started)).limit(limit)
+    )
+    if job_name is not None:
+        query = query.where(JobRun.job_name == job_name)
+    async with async_session() as session, session.begin():
+        return [JobRunRecord._make(job_run) for job_run in await session.execute(query)]
+
+
+async def delete_job_runs(before: datetime) -> int:
+    async with async_session() as session, session.begin():
+        result = await session.execute(delete(JobRun).where(JobRun.started < before))
+        return result.rowcount
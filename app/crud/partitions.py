@@ -0,0 +1,117 @@
+import re
+from datetime import date, datetime, time, timezone
+
+from sqlalchemy.sql import text
+
+from app.db.common import async_session
+from app.db.models import SCHEMA, AnimeInfo
+
+PARTITION_NAME = re.compile(rf"^{AnimeInfo.__tablename__}_p(\d{{4}})_(\d{{2}})$")
+
+
+def add_months(month: date, months: int) -> date:
+    month_index = month.year * 12 + month.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def get_partition_name(month: date) -> str:
+    return f"{AnimeInfo.__tablename__}_p{month.year:04d}_{month.month:02d}"
+
+
+async def get_anime_info_partitions() -> dict[date, str]:
+    async with async_session() as session, session.begin():
+        partitions = (
+            await session.execute(
+                text(
+                    """
+                    SELECT child.relname
+                    FROM pg_inherits
+                    JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+                    JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+                    JOIN pg_namespace ON pg_namespace.oid = parent.relnamespace
+                    WHERE pg_namespace.nspname = :schema AND parent.relname = :table
+                    """
+                ),
+                {"schema": SCHEMA, "table": AnimeInfo.__tablename__},
+            )
+        ).scalars()
+
+    result = {}
+    for partition in partitions:
+        match = PARTITION_NAME.match(partition)
+        if match:
+            result[date(int(match[1]), int(match[2]), 1)] = partition
+    return result
+
+
+async def create_anime_info_partitions(months_ahead: int) -> list[str]:
+    current_month = datetime.now(timezone.utc).date().replace(day=1)
+    existing = await get_anime_info_partitions()
+
+    created = []
+    async with async_session() as session, session.begin():
+        for offset in range(months_ahead + 1):
+            month = add_months(current_month, offset)
+            if month in existing:
+                continue
+            partition = get_partition_name(month)
+            await session.execute(
+                text(
+                    f"CREATE TABLE IF NOT EXISTS {SCHEMA}.{partition} "
+                    f"PARTITION OF {SCHEMA}.{AnimeInfo.__tablename__} "
+                    f"FOR VALUES FROM ('{month.isoformat()} 00:00+00') "
+                    f"TO ('{add_months(month, 1).isoformat()} 00:00+00')"
+                )
+            )
+            created.append(partition)
+    return created
+
+
+async def drop_anime_info_partitions(keep_months: int, detach_only: bool) -> list[str]:
+    # current month is always kept, whole partitions older than that are removed
+    current_month = datetime.now(timezone.utc).date().replace(day=1)
+    oldest_kept = add_months(current_month, -keep_months)
+    existing = await get_anime_info_partitions()
+    if not any(month < oldest_kept for month in existing):
+        return []
+    # copies are placed at the start of the oldest partition left,
+    # nothing is dropped until the current month partition exists
+    moved_to = min((month for month in existing if month >= oldest_kept), default=None)
+    if moved_to is None:
+        return []
+
+    dropped = []
+    async with async_session() as session, session.begin():
+        # titles untouched since then (paused ones) would lose all snapshots,
+        # their latest row is copied forward and stays the latest one
+        await session.execute(
+            text(
+                f"INSERT INTO {SCHEMA}.{AnimeInfo.__tablename__} "
+                "(anime_id, rank, mean, users_all, users_scored, status, "
+                "updated, last_seen) "
+                "SELECT anime_id, rank, mean, users_all, users_scored, status, "
+                ":moved, :moved FROM ("
+                "SELECT DISTINCT ON (anime_id) * "
+                f"FROM {SCHEMA}.{AnimeInfo.__tablename__} "
+                "ORDER BY anime_id, updated DESC"
+                ") AS latest WHERE latest.updated < :oldest_kept"
+            ),
+            {
+                "moved": datetime.combine(moved_to, time(), timezone.utc),
+                "oldest_kept": datetime.combine(oldest_kept, time(), timezone.utc),
+            },
+        )
+        for month, partition in sorted(existing.items()):
+            if month >= oldest_kept:
+                continue
+            if detach_only:
+                await session.execute(
+                    text(
+                        f"ALTER TABLE {SCHEMA}.{AnimeInfo.__tablename__} "
+                        f"DETACH PARTITION {SCHEMA}.{partition}"
+                    )
+                )
+            else:
+                await session.execute(text(f"DROP TABLE {SCHEMA}.{partition}"))
+            dropped.append(partition)
+    return dropped
@@ -0,0 +1,373 @@
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Callable, NamedTuple
+
+from sqlalchemy import Float, cast, column, desc, func, select, table, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Subquery
+
+from app.db.common import async_session
+from app.db.models import (
+    SCHEMA,
+    Anime,
+    AnimeInfo,
+    AnimeStatsDaily,
+    AnimeStatsWeekly,
+)
+
+STATS_FIELDS = ("mean", "rank", "users_all", "users_scored")
+TRENDS_ROLLUP_PERIOD = timedelta(days=7)
+
+# materialized view, created and owned by migrations
+anime_top_movers = table(
+    "anime_top_movers",
+    column("anime_id"),
+    column("rank"),
+    column("rank_climb"),
+    column("mean"),
+    column("mean_delta"),
+    column("users_all"),
+    column("users_delta"),
+    column("users_growth"),
+    column("rank_place"),
+    column("mean_place"),
+    column("users_place"),
+    column("refreshed"),
+    schema=SCHEMA,
+)
+TOP_MOVERS_PLACES = {
+    "rank": anime_top_movers.c.rank_place,
+    "mean": anime_top_movers.c.mean_place,
+    "users": anime_top_movers.c.users_place,
+}
+
+
+class AnimeStats(NamedTuple):
+    # rollup row of a day or a week, columns are selected in this order
+    anime_id: int
+    period_start: date
+    snapshots: int
+    first_updated: datetime
+    last_updated: datetime
+    first_mean: float
+    last_mean: float
+    min_mean: float
+    max_mean: float
+    delta_mean: float
+    first_rank: int | None
+    last_rank: int | None
+    min_rank: int | None
+    max_rank: int | None
+    delta_rank: int | None
+    first_users_all: int
+    last_users_all: int
+    min_users_all: int
+    max_users_all: int
+    delta_users_all: int
+    first_users_scored: int
+    last_users_scored: int
+    min_users_scored: int
+    max_users_scored: int
+    delta_users_scored: int
+
+
+class AnimeTrend(NamedTuple):
+    anime_id: int
+    anime_name: str
+    rank: int | None
+    rank_delta: int | None
+    mean: float
+    mean_delta: float
+    users_all: int
+    users_growth: float | None
+    scored_ratio_delta: float | None
+    covered: timedelta
+
+
+class TopMover(NamedTuple):
+    # fields follow anime_top_movers columns and name of the title
+    anime_id: int
+    rank: int | None
+    rank_climb: int | None
+    mean: float
+    mean_delta: float
+    users_all: int
+    users_delta: int
+    users_growth: float | None
+    rank_place: int
+    mean_place: int
+    users_place: int
+    refreshed: datetime
+    anime_name: str
+
+
+def get_day(updated: datetime) -> date:
+    return updated.astimezone(timezone.utc).date()
+
+
+def get_week(updated: datetime) -> date:
+    day = get_day(updated)
+    return day - timedelta(days=day.weekday())
+
+
+async def _upsert_stats(
+    session: AsyncSession,
+    model: type[AnimeStatsDaily] | type[AnimeStatsWeekly],
+    get_period_start: Callable[[datetime], date],
+    anime_infos: list[dict[str, Any]],
+) -> None:
+    rows = []
+    for anime_info in anime_infos:
+        row = {
+            "anime_id": anime_info["anime_id"],
+            "period_start": get_period_start(anime_info["updated"]),
+            "snapshots": 1,
+            "first_updated": anime_info["updated"],
+            "last_updated": anime_info["updated"],
+        }
+        for field in STATS_FIELDS:
+            for prefix in ("first", "last", "min", "max"):
+                row[f"{prefix}_{field}"] = anime_info[field]
+        rows.append(row)
+
+    # rows go as executemany parameters, one multi-values statement
+    # runs out of bind parameters on large watchlists
+    query = insert(model)
+    excluded = query.excluded
+    # first_* values are kept from the earliest snapshot of the period
+    values = {
+        "snapshots": model.snapshots + 1,
+        "last_updated": excluded.last_updated,
+    }
+    for field in STATS_FIELDS:
+        values[f"last_{field}"] = excluded[f"last_{field}"]
+        values[f"min_{field}"] = func.least(
+            getattr(model, f"min_{field}"), excluded[f"min_{field}"]
+        )
+        values[f"max_{field}"] = func.greatest(
+            getattr(model, f"max_{field}"), excluded[f"max_{field}"]
+        )
+    await session.execute(
+        query.on_conflict_do_update(
+            index_elements=[model.anime_id, model.period_start], set_=values
+        ),
+        rows,
+    )
+
+
+async def update_stats(session: AsyncSession, anime_infos: list[dict[str, Any]]):
+    if not anime_infos:
+        return
+    await _upsert_stats(session, AnimeStatsDaily, get_day, anime_infos)
+    await _upsert_stats(session, AnimeStatsWeekly, get_week, anime_infos)
+
+
+async def _get_stats(
+    model: type[AnimeStatsDaily] | type[AnimeStatsWeekly],
+    id: int,
+    since: date | None,
+) -> list[AnimeStats]:
+    query = (
+        select(*(getattr(model, field) for field in AnimeStats._fields))
+        .where(model.anime_id == id)
+        .order_by(desc(model.period_start))
+    )
+    if since is not None:
+        query = query.where(model.period_start >= since)
+    async with async_session() as session, session.begin():
+        return list(map(AnimeStats._make, await session.execute(query)))
+
+
+async def get_daily_stats(id: int, days: int | None) -> list[AnimeStats]:
+    # None gives the whole history
+    since = None
+    if days is not None:
+        since = get_day(datetime.now(timezone.utc)) - timedelta(days=days - 1)
+    return await _get_stats(AnimeStatsDaily, id, since)
+
+
+async def get_weekly_stats(id: int, weeks: int | None) -> list[AnimeStats]:
+    since = None
+    if weeks is not None:
+        since = get_week(datetime.now(timezone.utc)) - timedelta(weeks=weeks - 1)
+    return await _get_stats(AnimeStatsWeekly, id, since)
+
+
+def _get_snapshot_trends(since: datetime) -> Subquery:
+    # every snapshot still valid inside the period takes part,
+    # first one is the baseline and latest one is the current state
+    first_window = {"partition_by": AnimeInfo.anime_id, "order_by": AnimeInfo.updated}
+    return (
+        select(
+            AnimeInfo.anime_id,
+            AnimeInfo.rank,
+            AnimeInfo.mean,
+            AnimeInfo.users_all,
+            AnimeInfo.users_scored,
+            AnimeInfo.last_seen,
+            func.first_value(AnimeInfo.rank).over(**first_window).label("first_rank"),
+            func.first_value(AnimeInfo.mean).over(**first_window).label("first_mean"),
+            func.first_value(AnimeInfo.users_all)
+            .over(**first_window)
+            .label("first_users_all"),
+            func.first_value(AnimeInfo.users_scored)
+            .over(**first_window)
+            .label("first_users_scored"),
+            func.first_value(AnimeInfo.updated)
+            .over(**first_window)
+            .label("first_updated"),
+            func.row_number()
+            .over(partition_by=AnimeInfo.anime_id, order_by=desc(AnimeInfo.updated))
+            .label("row_number"),
+        )
+        .where(AnimeInfo.last_seen >= since)
+        .subquery()
+    )
+
+
+def _get_rollup_trends(since: date) -> Subquery:
+    # one row per title and day, first day is the baseline and latest one
+    # is the current state, same columns as snapshot trends
+    model = AnimeStatsDaily
+    first_window = {"partition_by": model.anime_id, "order_by": model.period_start}
+    return (
+        select(
+            model.anime_id,
+            model.last_rank.label("rank"),
+            model.last_mean.label("mean"),
+            model.last_users_all.label("users_all"),
+            model.last_users_scored.label("users_scored"),
+            model.last_updated.label("last_seen"),
+            func.first_value(model.first_rank).over(**first_window).label("first_rank"),
+            func.first_value(model.first_mean).over(**first_window).label("first_mean"),
+            func.first_value(model.first_users_all)
+            .over(**first_window)
+            .label("first_users_all"),
+            func.first_value(model.first_users_scored)
+            .over(**first_window)
+            .label("first_users_scored"),
+            func.first_value(model.first_updated)
+            .over(**first_window)
+            .label("first_updated"),
+            func.row_number()
+            .over(partition_by=model.anime_id, order_by=desc(model.period_start))
+            .label("row_number"),
+        )
+        .where(model.period_start >= since)
+        .subquery()
+    )
+
+
+async def get_anime_trends(period: timedelta) -> list[AnimeTrend]:
+    since = datetime.now(timezone.utc) - period
+    # long periods read daily rollups, their day granularity is close enough
+    snapshots = (
+        _get_rollup_trends(get_day(since))
+        if period >= TRENDS_ROLLUP_PERIOD
+        else _get_snapshot_trends(since)
+    )
+
+    users_all = cast(snapshots.c.users_all, Float)
+    first_users_all = cast(func.nullif(snapshots.c.first_users_all, 0), Float)
+    query = (
+        select(
+            snapshots.c.anime_id,
+            Anime.name.label("anime_name"),
+            snapshots.c.rank,
+            (snapshots.c.rank - snapshots.c.first_rank).label("rank_delta"),
+            snapshots.c.mean,
+            (snapshots.c.mean - snapshots.c.first_mean).label("mean_delta"),
+            snapshots.c.users_all,
+            (users_all / first_users_all * 100 - 100).label("users_growth"),
+            (
+                (
+                    snapshots.c.users_scored / func.nullif(users_all, 0)
+                    - snapshots.c.first_users_scored / first_users_all
+                )
+                * 100
+            ).label("scored_ratio_delta"),
+            (snapshots.c.last_seen - snapshots.c.first_updated).label("covered"),
+        )
+        .join(Anime, Anime.id == snapshots.c.anime_id)
+        .where(snapshots.c.row_number == 1)
+        .order_by(Anime.name)
+    )
+    async with async_session() as session, session.begin():
+        return list(map(AnimeTrend._make, await session.execute(query)))
+
+
+async def get_users_growth_rates(since: datetime) -> dict[int, float]:
+    # relative growth of users per day over snapshots still valid since the moment
+    covered_days = (
+        func.extract(
+            "epoch", func.max(AnimeInfo.last_seen) - func.min(AnimeInfo.updated)
+        )
+        / 86400
+    )
+    growth = cast(
+        func.max(AnimeInfo.users_all) - func.min(AnimeInfo.users_all), Float
+    ) / func.nullif(func.max(AnimeInfo.users_all), 0)
+    query = (
+        select(AnimeInfo.anime_id, growth / func.nullif(covered_days, 0))
+        .where(AnimeInfo.last_seen >= since)
+        .group_by(AnimeInfo.anime_id)
+    )
+    async with async_session() as session, session.begin():
+        return {
+            anime_id: rate or 0.0
+            for anime_id, rate in (await session.execute(query)).all()
+        }
+
+
+async def refresh_top_movers() -> None:
+    # concurrent refresh keeps the view readable while it is rebuilt
+    async with async_session() as session, session.begin():
+        await session.execute(
+            text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {SCHEMA}.anime_top_movers")
+        )
+
+
+async def get_top_movers(order: str, limit: int) -> list[TopMover]:
+    place = TOP_MOVERS_PLACES[order]
+    async with async_session() as session, session.begin():
+        return list(
+            map(
+                TopMover._make,
+                await session.execute(
+                    select(anime_top_movers, Anime.name.label("anime_name"))
+                    .join(Anime, Anime.id == anime_top_movers.c.anime_id)
+                    .order_by(place, Anime.name)
+                    .limit(limit)
+                ),
+            )
+        )
+
+
+async def get_last_refresh_time() -> datetime | None:
+    # rollups are touched by every refresh, unlike deduplicated snapshots
+    since = get_day(datetime.now(timezone.utc)) - timedelta(days=1)
+    async with async_session() as session, session.begin():
+        return await session.scalar(
+            select(func.max(AnimeStatsDaily.last_updated)).where(
+                AnimeStatsDaily.period_start >= since
+            )
+        )
+
+
+async def get_anime_series(since: datetime) -> list[tuple[float | None, ...]]:
+    # plain tuples of numbers, ready to be loaded into arrays
+    async with async_session() as session, session.begin():
+        return (
+            await session.execute(
+                select(
+                    AnimeInfo.anime_id,
+                    func.extract("epoch", AnimeInfo.updated),
+                    func.extract("epoch", AnimeInfo.last_seen),
+                    AnimeInfo.rank,
+                    AnimeInfo.users_all,
+                    AnimeInfo.users_scored,
+                )
+                .join(Anime, Anime.id == AnimeInfo.anime_id)
+                .where(AnimeInfo.last_seen >= since, Anime.tracked)
+            )
+        ).all()
@@ -1,6 +1,5 @@
 import logging
 import sys
-from typing import Any
 
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.sql import text
@@ -19,9 +18,3 @@ async def check_db(logger: logging.Logger) -> None:
     except Exception as e:
         logger.error(f"Failed to connect to database: {str(e)}")
         sys.exit(1)
-
-
-def get_model_dict(model: Any) -> dict[str, Any]:
-    return {
-        column.name: getattr(model, column.name) for column in model.__table__.columns
-    }
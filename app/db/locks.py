@@ -0,0 +1,99 @@
+import asyncio
+from collections.abc import AsyncGenerator
+from contextlib import asynccontextmanager, suppress
+
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlalchemy.sql import text
+
+from app.common.config import cfg
+from app.common.utils import get_logger, levelDEBUG, levelINFO
+from app.db.common import _engine
+
+LOCK_KEEPALIVE = 30
+
+logger = get_logger(levelDEBUG if cfg.ENV == "dev" else levelINFO)
+
+
+class AdvisoryLock:
+    # session level lock lives as long as its own connection, so the
+    # connection is kept out of the pool and pinged while the lock is held
+    def __init__(self, name: str, cancel_on_loss: bool = False) -> None:
+        self.name = name
+        self.cancel_on_loss = cancel_on_loss
+        self.connection: AsyncConnection | None = None
+        self.keepalive_task: asyncio.Task | None = None
+        self.owner_task: asyncio.Task | None = None
+        self.lost = False
+
+    async def acquire(self) -> bool:
+        connection = await _engine.connect()
+        try:
+            # no transaction stays open while the lock is held
+            connection = await connection.execution_options(
+                isolation_level="AUTOCOMMIT"
+            )
+            acquired = await connection.scalar(
+                text("SELECT pg_try_advisory_lock(hashtext(:name))"),
+                {"name": self.name},
+            )
+        except Exception:
+            await connection.close()
+            raise
+        if not acquired:
+            await connection.close()
+            return False
+        self.connection = connection
+        self.owner_task = asyncio.current_task()
+        self.keepalive_task = asyncio.create_task(self.keepalive())
+        return True
+
+    async def keepalive(self) -> None:
+        while True:
+            await asyncio.sleep(LOCK_KEEPALIVE)
+            try:
+                await self.connection.execute(text("SELECT 1"))
+            except Exception as e:
+                # server dropped the session and the lock with it
+                self.lost = True
+                logger.error(f"Lock {self.name} is lost: {str(e)}")
+                # another instance may take the lock, holder must not go on
+                if self.cancel_on_loss and self.owner_task:
+                    self.owner_task.cancel()
+                return
+
+    async def release(self) -> None:
+        if self.connection is None:
+            return
+        if self.keepalive_task:
+            self.keepalive_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self.keepalive_task
+        try:
+            await self.connection.execute(
+                text("SELECT pg_advisory_unlock(hashtext(:name))"),
+                {"name": self.name},
+            )
+        except Exception as e:
+            # connection must not go back to the pool still holding the lock
+            logger.error(f"Lock {self.name} wasn't released: {str(e)}")
+            with suppress(Exception):
+                await self.connection.invalidate()
+        with suppress(Exception):
+            await self.connection.close()
+        self.connection = None
+
+
+@asynccontextmanager
+async def advisory_lock(
+    name: str, cancel_on_loss: bool = False
+) -> AsyncGenerator[AdvisoryLock | None, None]:
+    # yields None without waiting when another instance holds the lock,
+    # with cancel_on_loss the holding task is cancelled when the lock is lost
+    lock = AdvisoryLock(name, cancel_on_loss)
+    if not await lock.acquire():
+        yield None
+        return
+    try:
+        yield lock
+    finally:
+        await lock.release()
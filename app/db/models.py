@@ -1,22 +1,143 @@
-from datetime import datetime
+from datetime import date, datetime
 
-from sqlalchemy import MetaData
-from sqlalchemy.orm import Mapped, declarative_base, mapped_column
+from sqlalchemy import Computed, ForeignKey, Index, MetaData, true
+from sqlalchemy.orm import Mapped, declarative_base, declared_attr, mapped_column
 from sqlalchemy.types import TIMESTAMP
 
 SCHEMA = "mytgbot"
 Base = declarative_base(metadata=MetaData(schema=SCHEMA))
 
 
+class Anime(Base):
+    __tablename__ = "anime"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    name: Mapped[str] = mapped_column(nullable=False)
+    added: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), nullable=False)
+    tracked: Mapped[bool] = mapped_column(nullable=False, server_default=true())
+    # written with every snapshot, per-title schedules read only the catalog
+    last_status: Mapped[str] = mapped_column(nullable=True)
+    last_checked: Mapped[datetime] = mapped_column(
+        TIMESTAMP(timezone=True), nullable=True
+    )
+
+
 class AnimeInfo(Base):
     __tablename__ = "anime_info"
+    # monthly partitions are managed by app.crud.partitions
+    __table_args__ = {"postgresql_partition_by": "RANGE (updated)"}
 
-    id: Mapped[int] = mapped_column(primary_key=True)
-    anime_id: Mapped[int] = mapped_column(nullable=False)
-    anime_name: Mapped[str] = mapped_column(nullable=False)
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    anime_id: Mapped[int] = mapped_column(
+        ForeignKey(f"{SCHEMA}.anime.id", ondelete="CASCADE"), nullable=False
+    )
     rank: Mapped[int] = mapped_column(nullable=True)
     mean: Mapped[float] = mapped_column(nullable=False)
     users_all: Mapped[int] = mapped_column(nullable=False)
     users_scored: Mapped[int] = mapped_column(nullable=False)
     status: Mapped[str] = mapped_column(nullable=False)
-    updated: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), nullable=False)
+    updated: Mapped[datetime] = mapped_column(
+        TIMESTAMP(timezone=True), primary_key=True, nullable=False
+    )
+    # time of the latest refresh that returned the same values
+    last_seen: Mapped[datetime] = mapped_column(
+        TIMESTAMP(timezone=True), nullable=False
+    )
+
+
+Index(
+    "ix_anime_info_anime_id_updated",
+    AnimeInfo.anime_id,
+    AnimeInfo.updated.desc(),
+)
+
+
+class AnimeStatsMixin:
+    @declared_attr
+    def anime_id(cls) -> Mapped[int]:
+        return mapped_column(
+            ForeignKey(f"{SCHEMA}.anime.id", ondelete="CASCADE"), primary_key=True
+        )
+
+    period_start: Mapped[date] = mapped_column(primary_key=True)
+    snapshots: Mapped[int] = mapped_column(nullable=False)
+    first_updated: Mapped[datetime] = mapped_column(
+        TIMESTAMP(timezone=True), nullable=False
+    )
+    last_updated: Mapped[datetime] = mapped_column(
+        TIMESTAMP(timezone=True), nullable=False
+    )
+
+    first_mean: Mapped[float] = mapped_column(nullable=False)
+    last_mean: Mapped[float] = mapped_column(nullable=False)
+    min_mean: Mapped[float] = mapped_column(nullable=False)
+    max_mean: Mapped[float] = mapped_column(nullable=False)
+    delta_mean: Mapped[float] = mapped_column(Computed("last_mean - first_mean"))
+
+    first_rank: Mapped[int] = mapped_column(nullable=True)
+    last_rank: Mapped[int] = mapped_column(nullable=True)
+    min_rank: Mapped[int] = mapped_column(nullable=True)
+    max_rank: Mapped[int] = mapped_column(nullable=True)
+    delta_rank: Mapped[int] = mapped_column(Computed("last_rank - first_rank"))
+
+    first_users_all: Mapped[int] = mapped_column(nullable=False)
+    last_users_all: Mapped[int] = mapped_column(nullable=False)
+    min_users_all: Mapped[int] = mapped_column(nullable=False)
+    max_users_all: Mapped[int] = mapped_column(nullable=False)
+    delta_users_all: Mapped[int] = mapped_column(
+        Computed("last_users_all - first_users_all")
+    )
+
+    first_users_scored: Mapped[int] = mapped_column(nullable=False)
+    last_users_scored: Mapped[int] = mapped_column(nullable=False)
+    min_users_scored: Mapped[int] = mapped_column(nullable=False)
+    max_users_scored: Mapped[int] = mapped_column(nullable=False)
+    delta_users_scored: Mapped[int] = mapped_column(
+        Computed("last_users_scored - first_users_scored")
+    )
+
+
+class AnimeStatsDaily(AnimeStatsMixin, Base):
+    __tablename__ = "anime_stats_daily"
+
+
+class AnimeStatsWeekly(AnimeStatsMixin, Base):
+    __tablename__ = "anime_stats_weekly"
+
+
+class JobState(Base):
+    __tablename__ = "job_state"
+
+    job_name: Mapped[str] = mapped_column(primary_key=True)
+    # scheduled time of the latest fired run, next runs are counted from it
+    last_run: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), nullable=False)
+    next_run: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), nullable=True)
+    last_finished: Mapped[datetime] = mapped_column(
+        TIMESTAMP(timezone=True), nullable=True
+    )
+    last_error: Mapped[str] = mapped_column(nullable=True)
+
+
+class JobRun(Base):
+    __tablename__ = "job_runs"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    job_name: Mapped[str] = mapped_column(nullable=False)
+    run_time: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), nullable=False)
+    next_run: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), nullable=True)
+    started: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), nullable=False)
+    finished: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), nullable=False)
+    error: Mapped[str] = mapped_column(nullable=True)
+    titles: Mapped[int] = mapped_column(nullable=False)
+    failures: Mapped[int] = mapped_column(nullable=False)
+    messages: Mapped[int] = mapped_column(nullable=False)
+    # seconds
+    mal_p50: Mapped[float] = mapped_column(nullable=True)
+    mal_p95: Mapped[float] = mapped_column(nullable=True)
+    mal_max: Mapped[float] = mapped_column(nullable=True)
+    db_time: Mapped[float] = mapped_column(nullable=False)
+
+
+Index("ix_job_runs_job_name_started", JobRun.job_name, JobRun.started.desc())
+# runs of all jobs are listed and cleaned up by start time alone
+Index("ix_job_runs_started", JobRun.started.desc())
@@ -0,0 +1,152 @@
+import asyncio
+import json
+from collections.abc import Callable
+from contextlib import suppress
+from typing import Any
+from uuid import uuid4
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+from sqlalchemy.sql import text
+
+from app.common.config import cfg
+from app.common.utils import get_logger, levelDEBUG, levelINFO
+from app.db.common import _engine
+
+CACHE_CHANNEL = "mytgbot_cache"
+LISTENER_KEEPALIVE = 30
+LISTENER_RETRY_DELAY = 10
+# payload of one notification is limited to 8000 bytes
+NOTIFY_CHUNK_SIZE = 200
+# events of this instance come back to it too and are skipped
+INSTANCE_ID = uuid4().hex
+
+logger = get_logger(levelDEBUG if cfg.ENV == "dev" else levelINFO)
+
+
+class CacheListener:
+    # every instance listens to writes of the others on its own connection,
+    # in-memory caches are used only while the listener is connected
+    def __init__(self) -> None:
+        self.connection: AsyncConnection | None = None
+        self.listen_task: asyncio.Task | None = None
+        self.lost: asyncio.Event | None = None
+        self.listening = False
+        self.handlers: dict[str, Callable[[Any], None]] = {}
+        self.reset_handlers: list[Callable[[], None]] = []
+
+    def subscribe(
+        self, handlers: dict[str, Callable[[Any], None]], reset: Callable[[], None]
+    ) -> None:
+        self.handlers |= handlers
+        self.reset_handlers.append(reset)
+
+    def reset(self) -> None:
+        for handler in self.reset_handlers:
+            handler()
+
+    def on_notification(
+        self, connection: Any, pid: int, channel: str, payload: str
+    ) -> None:
+        try:
+            event = json.loads(payload)
+            if event["instance"] == INSTANCE_ID:
+                return
+            handler = self.handlers.get(event["event"])
+            if handler:
+                handler(event["data"])
+        except Exception as e:
+            # event may be lost, nothing cached is trusted after it
+            logger.error(f"Cache event wasn't applied: {str(e)}")
+            self.reset()
+
+    def on_termination(self, connection: Any) -> None:
+        self.listening = False
+        if self.lost:
+            self.lost.set()
+
+    async def connect(self) -> None:
+        connection = await _engine.connect()
+        try:
+            # notifications are delivered only outside of transactions
+            connection = await connection.execution_options(
+                isolation_level="AUTOCOMMIT"
+            )
+            driver_connection = (
+                await connection.get_raw_connection()
+            ).driver_connection
+            driver_connection.add_termination_listener(self.on_termination)
+            await driver_connection.add_listener(CACHE_CHANNEL, self.on_notification)
+        except Exception:
+            await connection.close()
+            raise
+        self.connection = connection
+        self.lost = asyncio.Event()
+        # writes missed while not listening are dropped with all cached data
+        self.reset()
+        self.listening = True
+        logger.info("Listening to cache events")
+
+    async def disconnect(self) -> None:
+        self.listening = False
+        self.reset()
+        if self.connection is None:
+            return
+        with suppress(Exception):
+            await self.connection.invalidate()
+        with suppress(Exception):
+            await self.connection.close()
+        self.connection = None
+
+    async def keepalive(self) -> None:
+        while True:
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self.lost.wait(), LISTENER_KEEPALIVE)
+            if self.lost.is_set():
+                return
+            await self.connection.execute(text("SELECT 1"))
+
+    async def listen(self) -> None:
+        while True:
+            try:
+                if self.connection is None:
+                    await self.connect()
+                await self.keepalive()
+                logger.error("Cache events connection is closed")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Cache events aren't received: {str(e)}")
+            await self.disconnect()
+            await asyncio.sleep(LISTENER_RETRY_DELAY)
+
+    async def start(self) -> None:
+        # first connection is made before caches are warmed
+        try:
+            await self.connect()
+        except Exception as e:
+            logger.error(f"Cache events aren't received: {str(e)}")
+        self.listen_task = asyncio.create_task(self.listen())
+
+    async def stop(self) -> None:
+        if self.listen_task:
+            self.listen_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self.listen_task
+        await self.disconnect()
+
+
+cache_listener = CacheListener()
+
+
+async def notify_cache(session: AsyncSession, event: str, data: list[Any]) -> None:
+    # sent inside the writing transaction, so it's delivered only after commit
+    for start in range(0, max(len(data), 1), NOTIFY_CHUNK_SIZE):
+        payload = json.dumps(
+            {
+                "instance": INSTANCE_ID,
+                "event": event,
+                "data": data[start : start + NOTIFY_CHUNK_SIZE],
+            }
+        )
+        await session.execute(select(func.pg_notify(CACHE_CHANNEL, payload)))
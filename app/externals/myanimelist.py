@@ -1,46 +1,216 @@
+import asyncio
+import random
+from contextvars import ContextVar
 from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from time import perf_counter
 
 import httpx
+from cachetools import TTLCache
 
+from app.common.breaker import OPEN, CircuitBreaker
 from app.common.config import cfg
+from app.common.limiters import TokenBucket
 from app.common.utils import get_logger, levelDEBUG, levelINFO
 
 logger = get_logger(levelDEBUG if cfg.ENV == "dev" else levelINFO)
 
+FIELDS = ["mean", "num_list_users", "num_scoring_users", "rank", "status"]
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
 
-async def get_anime_info(id: int) -> dict[str, float | int | datetime]:
-    fields = ["mean", "num_list_users", "num_scoring_users", "rank", "status"]
+# latencies of http requests go to the list set by the caller, request tasks
+# inherit it, cached responses and open circuit never reach it
+mal_latencies: ContextVar[list[float] | None] = ContextVar(
+    "mal_latencies", default=None
+)
+
+
+class MALClient:
+    def __init__(self) -> None:
+        self._client: httpx.AsyncClient | None = None
+        self.limiter = TokenBucket(cfg.MAL_RATE_LIMIT, cfg.MAL_RATE_BURST)
+        self.cache = TTLCache(maxsize=cfg.MAL_CACHE_SIZE, ttl=cfg.MAL_CACHE_TTL)
+        self.inflight: dict[int, asyncio.Task] = {}
+        self.breaker = CircuitBreaker(
+            cfg.MAL_BREAKER_THRESHOLD, cfg.MAL_BREAKER_COOLDOWN
+        )
+        self.stats = {"requests": 0, "retries": 0, "failures": 0, "fast_failed": 0}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # fallback for calls made outside of app lifespan (scripts, shell)
+        if self._client is None or self._client.is_closed:
+            self.start()
+        return self._client
+
+    def start(self) -> None:
+        self._client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=cfg.MAL_MAX_CONNECTIONS,
+                max_keepalive_connections=cfg.MAL_MAX_KEEPALIVE,
+                keepalive_expiry=cfg.MAL_KEEPALIVE_EXPIRY,
+            ),
+            timeout=cfg.MAL_TIMEOUT,
+            http2=cfg.MAL_HTTP2,
+        )
+        logger.info("MAL client started")
+
+    async def close(self) -> None:
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+            logger.info("MAL client closed")
+        self._client = None
+
+    async def get(self, path: str) -> httpx.Response:
+        # url, creds and limits are taken on each call to respect secrets reload
+        self.limiter.configure(cfg.MAL_RATE_LIMIT, cfg.MAL_RATE_BURST)
+        await self.limiter.acquire()
+        self.stats["requests"] += 1
+        # measured without waiting for the limiter
+        started = perf_counter()
+        try:
+            return await self.client.get(
+                f"{cfg.MAL_API}{path}",
+                params={"fields": ",".join(FIELDS)},
+                headers={cfg.MAL_HEADER: cfg.MAL_CLIENT_ID},
+            )
+        finally:
+            latencies = mal_latencies.get()
+            if latencies is not None:
+                latencies.append(perf_counter() - started)
+
+    def get_cached(self, id: int) -> dict[str, float | int | datetime] | None:
+        if cfg.MAL_CACHE_TTL <= 0:
+            return None
+        if (self.cache.ttl, self.cache.maxsize) != (
+            cfg.MAL_CACHE_TTL,
+            cfg.MAL_CACHE_SIZE,
+        ):
+            self.cache = TTLCache(maxsize=cfg.MAL_CACHE_SIZE, ttl=cfg.MAL_CACHE_TTL)
+        return self.cache.get(id)
+
+    def set_cached(self, id: int, anime_info: dict[str, float | int | datetime]):
+        if cfg.MAL_CACHE_TTL > 0:
+            self.cache[id] = anime_info
+
+    def get_status(self) -> dict[str, dict[str, str | int | float | None]]:
+        return {
+            "breaker": self.breaker.get_status(),
+            "stats": dict(self.stats),
+            "cache": {"size": len(self.cache), "inflight": len(self.inflight)},
+        }
+
+
+mal_client = MALClient()
+
+
+def get_backoff(attempt: int) -> float:
+    delay = min(cfg.MAL_BACKOFF_MAX, cfg.MAL_BACKOFF_BASE * 2**attempt)
+    return random.uniform(delay / 2, delay)
+
+
+def get_retry_after(response: httpx.Response) -> float | None:
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
     try:
-        async with httpx.AsyncClient(
-            base_url=cfg.MAL_API,
-            params={"fields": ",".join(fields)},
-            headers={cfg.MAL_HEADER: cfg.MAL_CLIENT_ID},
-        ) as ac:
-            response = await ac.get(f"/anime/{id}")
-            if response.status_code != 200:
-                details = ""
-                try:
-                    details = str(response.json())
-                except Exception:
-                    pass
-                logger.error(
-                    f"Error getting anime {id} info. Code: {response.status_code}, Details: {details}."
-                )
-                return {"error_code": response.status_code}
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
     except Exception:
+        return None
+
+
+async def get_anime_info(
+    id: int, force: bool = False
+) -> dict[str, float | int | datetime]:
+    # force skips cached response, but still joins an in-flight request for the id
+    if not force:
+        anime_info = mal_client.get_cached(id)
+        if anime_info is not None:
+            return dict(anime_info)
+
+    task = mal_client.inflight.get(id)
+    if task is None:
+        task = asyncio.create_task(_fetch_anime_info(id))
+        mal_client.inflight[id] = task
+        task.add_done_callback(lambda _: mal_client.inflight.pop(id, None))
+    # shield keeps shared request alive if one of waiters is cancelled
+    return dict(await asyncio.shield(task))
+
+
+async def _fetch_anime_info(id: int) -> dict[str, float | int | datetime]:
+    breaker = mal_client.breaker
+    breaker.configure(cfg.MAL_BREAKER_THRESHOLD, cfg.MAL_BREAKER_COOLDOWN)
+    if not breaker.allow():
+        mal_client.stats["fast_failed"] += 1
+        logger.warning(f"MAL circuit is open, anime {id} info skipped")
+        return {"error_code": "circuit_open"}
+
+    response = None
+    delay = 0.0
+    for attempt in range(cfg.MAL_RETRIES + 1):
+        if attempt:
+            # another request has opened the circuit, stop hammering
+            if breaker.state == OPEN:
+                break
+            mal_client.stats["retries"] += 1
+            await asyncio.sleep(delay)
+
+        try:
+            response = await mal_client.get(f"/anime/{id}")
+        except httpx.TransportError as e:
+            logger.warning(f"Error getting anime {id} info from MAL api: {repr(e)}")
+            response = None
+            delay = get_backoff(attempt)
+            continue
+        except Exception:
+            logger.error(f"Error getting anime {id} info from MAL api")
+            return {"error_code": ""}
+
+        if response.status_code not in RETRY_STATUS_CODES:
+            break
+        retry_after = get_retry_after(response)
+        delay = get_backoff(attempt) if retry_after is None else retry_after
+        if delay > cfg.MAL_BACKOFF_MAX:
+            break
+
+    if response is None or response.status_code in RETRY_STATUS_CODES:
+        breaker.record_failure()
+        mal_client.stats["failures"] += 1
+    else:
+        breaker.record_success()
+
+    if response is None:
         logger.error(f"Error getting anime {id} info from MAL api")
         return {"error_code": ""}
+    if response.status_code != 200:
+        details = ""
+        try:
+            details = str(response.json())
+        except Exception:
+            pass
+        logger.error(
+            f"Error getting anime {id} info. Code: {response.status_code}, Details: {details}."
+        )
+        return {"error_code": response.status_code}
 
     try:
-        anime_info = response.json()
-        return {
-            "rank": anime_info["rank"],
-            "mean": anime_info["mean"],
-            "users_all": anime_info["num_list_users"],
-            "users_scored": anime_info["num_scoring_users"],
-            "status": anime_info["status"],
+        response_info = response.json()
+        anime_info = {
+            "rank": response_info["rank"],
+            "mean": response_info["mean"],
+            "users_all": response_info["num_list_users"],
+            "users_scored": response_info["num_scoring_users"],
+            "status": response_info["status"],
             "updated": datetime.now(timezone.utc),
         }
     except Exception:
         logger.error(f"Error getting anime {id} details from API response")
         return {}
+
+    mal_client.set_cached(id, anime_info)
+    return anime_info
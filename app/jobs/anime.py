@@ -1,19 +1,148 @@
+import asyncio
+import zlib
 from contextlib import suppress
 from datetime import datetime, time, timedelta, timezone
+from typing import Any
 
 from aiogram.exceptions import TelegramBadRequest
-from aiogram.utils import formatting
+from aiogram.types import MessageEntity
 
 from app.common.config import cfg
 from app.crud import anime as crud_anime
-from app.db.common import get_model_dict
+from app.crud import stats as crud_stats
 from app.externals.myanimelist import get_anime_info
 from app.jobs._base import JobBase
+from app.jobs.triggers import CronTrigger, IntervalTrigger, Trigger
 from app.telegram.bot import bot
+from app.telegram.utils.diff import render_snapshot_diff
+
+# in per-title modes the materialized view is refreshed not more often than that
+TICK_TOP_MOVERS_INTERVAL = 300
+GROWTH_RATES_TTL = 3600
+
+
+def get_slot_offset(anime_id: int, period: timedelta) -> timedelta:
+    # crc32 is stable between restarts, unlike hash() of str
+    period_ms = max(int(period.total_seconds() * 1000), 1)
+    return timedelta(milliseconds=zlib.crc32(str(anime_id).encode()) % period_ms)
+
+
+def is_slot_due(
+    anime_id: int, last_check: datetime, period: timedelta, curr_time: datetime
+) -> bool:
+    # slots of a title are epoch + offset + k * period, the latest passed slot
+    # must not be older than the latest check of the title
+    epoch = datetime.fromtimestamp(0, tz=timezone.utc)
+    offset = get_slot_offset(anime_id, period)
+    slot_time = curr_time - (curr_time - epoch - offset) % period
+    return last_check < slot_time
 
 
 class AnimeJob(JobBase):
-    def get_interval(self) -> int:
+    def __init__(self, job_name: str) -> None:
+        super().__init__(job_name)
+        self.top_movers_pending = False
+        self.top_movers_refreshed = 0.0
+        # failed titles wait for their next due time instead of every tick
+        self.attempts: dict[int, datetime] = {}
+        self.growth_rates: dict[int, float] = {}
+        self.growth_rates_loaded: float | None = None
+
+    def get_trigger(self) -> Trigger | None:
+        # worker ticks all the time and picks titles which are due,
+        # only spread mode takes its period from the schedule
+        if cfg.ANIME_UPDATE_MODE == "adaptive":
+            return IntervalTrigger(cfg.ANIME_UPDATE_TICK, catch_up=False)
+        update_trigger = self.get_update_trigger()
+        if update_trigger is None or cfg.ANIME_UPDATE_MODE == "batch":
+            return update_trigger
+        return IntervalTrigger(cfg.ANIME_UPDATE_TICK, catch_up=False)
+
+    def get_update_period(self, curr_time: datetime) -> timedelta | None:
+        update_trigger = self.get_update_trigger()
+        if update_trigger is None:
+            return None
+        return update_trigger.get_next(
+            curr_time, curr_time
+        ) - update_trigger.get_previous(curr_time, curr_time)
+
+    async def load_growth_rates(self) -> None:
+        loop_time = asyncio.get_running_loop().time()
+        if (
+            self.growth_rates_loaded is not None
+            and loop_time - self.growth_rates_loaded < GROWTH_RATES_TTL
+        ):
+            return
+        since = datetime.now(timezone.utc) - timedelta(
+            days=cfg.ANIME_ADAPTIVE_WINDOW_DAYS
+        )
+        try:
+            with self.metrics.track_db():
+                self.growth_rates = await crud_stats.get_users_growth_rates(since)
+            self.growth_rates_loaded = loop_time
+        except Exception as e:
+            self.logger.error(f"{self.job_name}: growth rates: {str(e)}")
+
+    def get_title_interval(self, anime_id: int, status: str | None) -> timedelta:
+        interval = cfg.ANIME_ADAPTIVE_STATUSES.get(
+            status, cfg.ANIME_ADAPTIVE_MAX_INTERVAL
+        )
+        # title growing by growth unit a day is polled twice as often
+        growth_rate = self.growth_rates.get(anime_id, 0.0)
+        interval /= 1 + growth_rate / cfg.ANIME_ADAPTIVE_GROWTH_UNIT
+        return timedelta(
+            seconds=min(
+                max(interval, cfg.ANIME_ADAPTIVE_MIN_INTERVAL),
+                cfg.ANIME_ADAPTIVE_MAX_INTERVAL,
+            )
+        )
+
+    def is_title_due(
+        self,
+        anime_check: crud_anime.AnimeCheck,
+        last_check: datetime,
+        period: timedelta,
+        curr_time: datetime,
+    ) -> bool:
+        if cfg.ANIME_UPDATE_MODE == "spread":
+            return is_slot_due(anime_check.id, last_check, period, curr_time)
+        return curr_time - last_check >= self.get_title_interval(
+            anime_check.id, anime_check.last_status
+        )
+
+    async def get_due_ids(
+        self, all_checks: list[crud_anime.AnimeCheck], curr_time: datetime
+    ) -> list[int]:
+        # decided on the catalog alone, snapshots are loaded for due titles only
+        if cfg.ANIME_UPDATE_MODE == "spread":
+            period = self.get_update_period(curr_time)
+            if period is None:
+                return []
+        else:
+            await self.load_growth_rates()
+            period = timedelta(seconds=cfg.ANIME_ADAPTIVE_MAX_INTERVAL)
+        # attempts older than a period can't hold back any title
+        self.attempts = {
+            anime_id: attempt_time
+            for anime_id, attempt_time in self.attempts.items()
+            if curr_time - attempt_time < period
+        }
+        due_ids = []
+        for anime_check in all_checks:
+            last_check = anime_check.last_checked
+            attempt_time = self.attempts.get(anime_check.id)
+            if attempt_time and (last_check is None or attempt_time > last_check):
+                last_check = attempt_time
+            if last_check is None or self.is_title_due(
+                anime_check, last_check, period, curr_time
+            ):
+                due_ids.append(anime_check.id)
+                self.attempts[anime_check.id] = curr_time
+        if due_ids:
+            self.logger.debug(f"{self.job_name}: {len(due_ids)} titles due")
+        return due_ids
+
+    def get_update_trigger(self) -> Trigger | None:
         try:
             if cfg.ANIME_UPDATE_TYPE == "delay":
                 coeff = 1
@@ -23,89 +152,143 @@ class AnimeJob(JobBase):
                     coeff = 60 * 60
                 elif cfg.ANIME_UPDATE_DELAY_UNIT == "days":
                     coeff = 60 * 60 * 24
-                return cfg.ANIME_UPDATE_DELAY_VALUE * coeff
+                return IntervalTrigger(
+                    cfg.ANIME_UPDATE_DELAY_VALUE * coeff,
+                    cfg.ANIME_UPDATE_JITTER,
+                    cfg.ANIME_UPDATE_CATCH_UP,
+                )
             elif cfg.ANIME_UPDATE_TYPE == "update_at":
                 update_at = time.fromisoformat(f"{cfg.ANIME_UPDATE_AT}:00")
-
-                current_time = datetime.now(timezone.utc)
-                planned_time = datetime(
-                    current_time.year,
-                    current_time.month,
-                    current_time.day,
-                    update_at.hour,
-                    update_at.minute,
-                    tzinfo=timezone.utc,
+                return CronTrigger(
+                    f"{update_at.minute} {update_at.hour} * * *",
+                    cfg.ANIME_UPDATE_JITTER,
+                    cfg.ANIME_UPDATE_CATCH_UP,
+                )
+            elif cfg.ANIME_UPDATE_TYPE == "cron":
+                return CronTrigger(
+                    cfg.ANIME_UPDATE_CRON,
+                    cfg.ANIME_UPDATE_JITTER,
+                    cfg.ANIME_UPDATE_CATCH_UP,
                 )
-                return (planned_time - current_time).seconds
         except Exception:
-            self.logger.info(f"{self.job_name}: wrong interval params")
-            return -1
+            self.logger.info(f"{self.job_name}: wrong schedule params")
+        return None
 
     async def loop_task(self) -> None:
         curr_time = datetime.now(tz=timezone.utc)
+        semaphore = asyncio.Semaphore(cfg.ANIME_UPDATE_CONCURRENCY)
 
-        all_anime = await crud_anime.get_all_anime()
-        for anime in all_anime:
-            anime_id = anime["id"]
-            anime_name = anime["name"]
-
-            anime_info = await get_anime_info(anime_id)
-
-            if not anime_info:
-                with suppress(TelegramBadRequest):
-                    await bot.send_message(
-                        chat_id=cfg.OWNER_ID, text=f"Didn't get {anime_name} anime info"
+        async def get_anime_update_limited(
+            last_info: crud_anime.AnimeSnapshot,
+        ) -> tuple[dict[str, Any], tuple[str, list[MessageEntity]]] | None:
+            async with semaphore:
+                try:
+                    return await self.get_anime_update(last_info, curr_time)
+                except Exception as e:
+                    self.logger.error(
+                        f"{self.job_name}: anime {last_info.anime_id} update failed: {str(e)}"
                     )
-                    return
+                    return None
 
-            last_info = get_model_dict(await crud_anime.get_last_info(anime_id))
+        if cfg.ANIME_UPDATE_MODE == "batch":
+            with self.metrics.track_db():
+                all_last_info = await crud_anime.get_all_last_info(tracked_only=True)
+        else:
+            with self.metrics.track_db():
+                all_checks = await crud_anime.get_anime_checks()
+            due_ids = await self.get_due_ids(all_checks, curr_time)
+            if not due_ids:
+                self.metrics.idle = True
+                await self.refresh_top_movers()
+                return
+            with self.metrics.track_db():
+                all_last_info = await crud_anime.get_last_infos(due_ids)
 
-            message_info = [formatting.Bold(f"{anime_name}: \n")]
-            for key in anime_info.keys():
-                try:
-                    diff = anime_info[key] - last_info[key]
-                except Exception:
-                    diff = None
-                if isinstance(diff, timedelta):
-                    info_str = f"+{diff.days} d, {diff.seconds // 3600} h, {(diff.seconds // 60) % 60} m"
-                    diff_str = ""
-                elif diff == None:
-                    if last_info[key] == anime_info[key]:
-                        info_str = last_info[key]
-                    else:
-                        info_str = f"{last_info[key]} -> {anime_info[key]}"
-                    diff_str = ""
-                else:
-                    diff_str = "{:,}".format(round(diff, 3)).replace(",", " ")
-                    if diff >= 0:
-                        diff_str = "+" + diff_str
-                    info_str = "{:,}".format(anime_info[key]).replace(",", " ")
-                message_info.extend(
-                    [
-                        formatting.Bold(f"{key.replace('_', ' ').capitalize()}:   "),
-                        f" {info_str}",
-                    ]
+        with self.metrics.track_mal():
+            results = await asyncio.gather(
+                *(get_anime_update_limited(last_info) for last_info in all_last_info)
+            )
+        updates = [result for result in results if result]
+        self.metrics.titles = len(all_last_info)
+        self.metrics.failures = len(all_last_info) - len(updates)
+
+        # all snapshots of the run are saved at once or not at all
+        try:
+            with self.metrics.track_db():
+                await crud_anime.add_anime_infos(
+                    [anime_info for anime_info, _ in updates],
+                    (
+                        {last_info.anime_id: last_info for last_info in all_last_info}
+                        if cfg.ANIME_UPDATE_DEDUP
+                        else None
+                    ),
                 )
-                if diff_str:
-                    message_info.append(formatting.Italic(f" ({diff_str})"))
-                message_info.append("\n")
-            await crud_anime.add_anime_info(
-                id=anime_id,
-                name=anime_name,
-                rank=anime_info["rank"],
-                mean=anime_info["mean"],
-                users_all=anime_info["users_all"],
-                users_scored=anime_info["users_scored"],
-                status=anime_info["status"],
-                updated=curr_time,
+        except Exception:
+            await self.send_message("Anime info wasn't saved, run failed")
+            raise
+
+        if updates:
+            self.top_movers_pending = True
+        await self.refresh_top_movers()
+
+        for _, (message_text, message_entities) in updates:
+            await self.send_message(message_text, message_entities)
+
+        failed = [
+            last_info.anime_name
+            for last_info, result in zip(all_last_info, results)
+            if not result
+        ]
+        if failed:
+            await self.send_message("Didn't get anime info:\n" + "\n".join(failed))
+
+    async def send_message(
+        self, message_text: str, message_entities: list[MessageEntity] | None = None
+    ) -> None:
+        with suppress(TelegramBadRequest):
+            await bot.send_message(
+                chat_id=cfg.OWNER_ID, text=message_text, entities=message_entities
             )
+            self.metrics.messages += 1
 
-            message_text, message_entities = formatting.Text(*message_info).render()
+    async def refresh_top_movers(self) -> None:
+        if not self.top_movers_pending:
+            return
+        # small runs come every tick, view is rebuilt for a batch of them
+        loop_time = asyncio.get_running_loop().time()
+        if (
+            cfg.ANIME_UPDATE_MODE != "batch"
+            and loop_time - self.top_movers_refreshed < TICK_TOP_MOVERS_INTERVAL
+        ):
+            return
+        try:
+            with self.metrics.track_db():
+                await crud_stats.refresh_top_movers()
+            self.top_movers_pending = False
+            self.top_movers_refreshed = loop_time
+        except Exception as e:
+            self.logger.error(f"{self.job_name}: top movers refresh: {str(e)}")
 
-            with suppress(TelegramBadRequest):
-                await bot.send_message(
-                    chat_id=cfg.OWNER_ID, text=message_text, entities=message_entities
-                )
+    async def get_anime_update(
+        self, last_info: crud_anime.AnimeSnapshot, curr_time: datetime
+    ) -> tuple[dict[str, Any], tuple[str, list[MessageEntity]]] | None:
+        anime_id = last_info.anime_id
+        anime_name = last_info.anime_name
+
+        anime_info = await get_anime_info(anime_id)
+        if not anime_info or "error_code" in anime_info:
+            return None
+
+        new_info = {
+            "anime_id": anime_id,
+            "rank": anime_info["rank"],
+            "mean": anime_info["mean"],
+            "users_all": anime_info["users_all"],
+            "users_scored": anime_info["users_scored"],
+            "status": anime_info["status"],
+            "updated": curr_time,
+        }
+        return new_info, render_snapshot_diff(anime_name, last_info, anime_info)
 
 
 anime_job = AnimeJob(job_name="Anime")
@@ -0,0 +1,50 @@
+from collections.abc import Iterator
+from contextlib import contextmanager
+from math import ceil
+from time import perf_counter
+
+from app.externals.myanimelist import mal_latencies
+
+
+def get_percentile(values: list[float], percent: float) -> float | None:
+    # nearest rank, values must be sorted
+    if not values:
+        return None
+    return values[max(ceil(len(values) * percent / 100) - 1, 0)]
+
+
+class RunMetrics:
+    # collected by a job during one run and saved by the scheduler after it
+    def __init__(self) -> None:
+        self.titles = 0
+        self.failures = 0
+        self.messages = 0
+        self.mal_latencies: list[float] = []
+        self.db_time = 0.0
+        # run had nothing to do, such runs aren't saved
+        self.idle = False
+
+    @contextmanager
+    def track_db(self) -> Iterator[None]:
+        started = perf_counter()
+        try:
+            yield
+        finally:
+            self.db_time += perf_counter() - started
+
+    @contextmanager
+    def track_mal(self) -> Iterator[None]:
+        # requests started inside are collected, each retry is one of them
+        token = mal_latencies.set(self.mal_latencies)
+        try:
+            yield
+        finally:
+            mal_latencies.reset(token)
+
+    def get_mal_latencies(self) -> dict[str, float | None]:
+        latencies = sorted(self.mal_latencies)
+        return {
+            "mal_p50": get_percentile(latencies, 50),
+            "mal_p95": get_percentile(latencies, 95),
+            "mal_max": latencies[-1] if latencies else None,
+        }
@@ -0,0 +1,49 @@
+from datetime import datetime, timedelta, timezone
+
+from app.common.config import cfg
+from app.crud import anime as crud_anime
+from app.crud import jobs as crud_jobs
+from app.crud import partitions as crud_partitions
+from app.jobs._base import JobBase
+from app.jobs.triggers import IntervalTrigger, Trigger
+
+JOB_RUNS_KEEP_DAYS = 30
+
+
+class PartitionsJob(JobBase):
+    def get_trigger(self) -> Trigger:
+        # app startup runs it anyway, missed runs aren't caught up
+        return IntervalTrigger(60 * 60 * 24, catch_up=False)
+
+    async def loop_task(self) -> None:
+        with self.metrics.track_db():
+            deleted = await crud_jobs.delete_job_runs(
+                datetime.now(timezone.utc) - timedelta(days=JOB_RUNS_KEEP_DAYS)
+            )
+        if deleted:
+            self.logger.info(f"{self.job_name}: deleted {deleted} old job runs")
+
+        with self.metrics.track_db():
+            created = await crud_partitions.create_anime_info_partitions(
+                cfg.ANIME_PARTITIONS_AHEAD
+            )
+        if created:
+            self.logger.info(f"{self.job_name}: created {', '.join(created)}")
+
+        if cfg.ANIME_RETENTION_MONTHS is None:
+            return
+        with self.metrics.track_db():
+            dropped = await crud_partitions.drop_anime_info_partitions(
+                cfg.ANIME_RETENTION_MONTHS,
+                detach_only=cfg.ANIME_RETENTION_MODE == "detach",
+            )
+        if dropped:
+            # latest snapshot of a long untouched title may have gone with them
+            with self.metrics.track_db():
+                await crud_anime.warm_cache(broadcast=True)
+            self.logger.info(
+                f"{self.job_name}: {cfg.ANIME_RETENTION_MODE} {', '.join(dropped)}"
+            )
+
+
+partitions_job = PartitionsJob(job_name="Partitions")
@@ -0,0 +1,199 @@
+import asyncio
+import random
+from datetime import datetime, timezone
+
+from app.common.config import cfg
+from app.common.utils import get_logger, levelDEBUG, levelINFO
+from app.crud import jobs as crud_jobs
+from app.db.locks import advisory_lock
+from app.jobs._base import JobBase
+from app.jobs.metrics import RunMetrics
+from app.jobs.triggers import Trigger
+
+SCHEDULER_ERROR_DELAY = 60
+# interval grids of all instances start here, so they fire the same runs
+SCHEDULER_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class ScheduledJob:
+    def __init__(self, job: JobBase) -> None:
+        self.job = job
+        self.loop_task: asyncio.Task | None = None
+        self.run_task: asyncio.Task | None = None
+        self.last_run: datetime | None = None
+        self.next_run: datetime | None = None
+
+
+class Scheduler:
+    def __init__(self) -> None:
+        self.logger = get_logger(levelDEBUG if cfg.ENV == "dev" else levelINFO)
+        self.jobs: dict[str, ScheduledJob] = {}
+
+    def register(self, job: JobBase) -> None:
+        self.jobs[job.job_name] = ScheduledJob(job)
+
+    async def start(self) -> None:
+        for job_name, scheduled in self.jobs.items():
+            # saved state is loaded by the loop before every run
+            self.logger.info(f"{job_name}: job start")
+            scheduled.loop_task = asyncio.create_task(self.loop(scheduled))
+
+    async def stop(self) -> None:
+        tasks = []
+        for job_name, scheduled in self.jobs.items():
+            self.logger.info(f"{job_name}: job stop")
+            for task in (scheduled.loop_task, scheduled.run_task):
+                if task and not task.done():
+                    task.cancel()
+                    tasks.append(task)
+        # runs must be over before db engine and clients are closed
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def load_last_run(self, scheduled: ScheduledJob) -> None:
+        # runs done by other instances move this one along the same grid
+        job_name = scheduled.job.job_name
+        try:
+            job_state = await crud_jobs.get_job_state(job_name)
+        except Exception as e:
+            self.logger.error(f"{job_name}: job state wasn't loaded: {str(e)}")
+            return
+        if job_state and (
+            scheduled.last_run is None or job_state.last_run > scheduled.last_run
+        ):
+            scheduled.last_run = job_state.last_run
+
+    def get_due(
+        self, scheduled: ScheduledJob, trigger: Trigger
+    ) -> tuple[datetime, float]:
+        # returns scheduled time of the run and delay before firing it
+        job_name = scheduled.job.job_name
+        now = datetime.now(timezone.utc)
+        jitter = random.uniform(0, trigger.jitter) if trigger.jitter > 0 else 0.0
+        last_run = scheduled.last_run
+        if last_run is None:
+            run_time = trigger.get_next(SCHEDULER_EPOCH, now)
+            return run_time, (run_time - now).total_seconds() + jitter
+
+        run_time = trigger.get_next(last_run, last_run)
+        if run_time > now:
+            return run_time, (run_time - now).total_seconds() + jitter
+
+        # runs were missed while app was down, all of them are coalesced into one
+        if trigger.catch_up:
+            run_time = trigger.get_previous(last_run, now)
+            self.logger.info(f"{job_name}: catching up run of {run_time}")
+            return run_time, 0.0
+        run_time = trigger.get_next(last_run, now)
+        self.logger.info(f"{job_name}: missed runs skipped till {run_time}")
+        return run_time, (run_time - now).total_seconds() + jitter
+
+    async def sleep(self, delay: float) -> None:
+        # deadline is on monotonic clock, wall clock changes don't shift it
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + delay
+        while (remaining := deadline - loop.time()) > 0:
+            await asyncio.sleep(remaining)
+
+    async def loop(self, scheduled: ScheduledJob) -> None:
+        job = scheduled.job
+        while True:
+            try:
+                trigger = job.get_trigger()
+                if trigger is None:
+                    self.logger.info(f"{job.job_name}: no trigger, job stop")
+                    return
+                await self.load_last_run(scheduled)
+                run_time, delay = self.get_due(scheduled, trigger)
+                scheduled.next_run = run_time
+                await self.sleep(delay)
+                await self.fire(scheduled, trigger, run_time)
+            except asyncio.CancelledError:
+                return
+            except Exception as e:
+                self.logger.error(f"Loop Job for {job.job_name}: {str(e)}")
+                await asyncio.sleep(SCHEDULER_ERROR_DELAY)
+
+    async def fire(
+        self, scheduled: ScheduledJob, trigger: Trigger, run_time: datetime
+    ) -> None:
+        job_name = scheduled.job.job_name
+        # next run is counted from scheduled time, not from the end of this one
+        scheduled.last_run = run_time
+        scheduled.next_run = trigger.get_next(run_time, run_time)
+        if scheduled.run_task and not scheduled.run_task.done():
+            self.logger.warning(f"{job_name}: previous run is in progress, skipped")
+            return
+        scheduled.run_task = asyncio.create_task(
+            self.run(scheduled, run_time, scheduled.next_run)
+        )
+
+    async def run(
+        self, scheduled: ScheduledJob, run_time: datetime, next_run: datetime
+    ) -> None:
+        # every instance fires the same run, only one of them executes it
+        job_name = scheduled.job.job_name
+        lock = None
+        try:
+            async with advisory_lock(f"job:{job_name}", cancel_on_loss=True) as lock:
+                if lock is None:
+                    self.logger.debug(f"{job_name}: run is held by another instance")
+                    return
+                job_state = await crud_jobs.get_job_state(job_name)
+                if job_state and job_state.last_run >= run_time:
+                    self.logger.debug(f"{job_name}: run of {run_time} is already done")
+                    return
+                await crud_jobs.set_job_run(job_name, run_time, next_run)
+                await self.execute(scheduled, run_time, next_run)
+        except asyncio.CancelledError:
+            # run is abandoned, its state and record are left to the new holder,
+            # cancellation goes on so the run task just ends as cancelled
+            if lock is not None and lock.lost:
+                self.logger.error(f"{job_name}: run of {run_time} stopped, lock lost")
+            raise
+        except Exception as e:
+            self.logger.error(f"{job_name}: run wasn't started: {str(e)}")
+
+    async def execute(
+        self, scheduled: ScheduledJob, run_time: datetime, next_run: datetime
+    ) -> None:
+        job_name = scheduled.job.job_name
+        metrics = scheduled.job.metrics = RunMetrics()
+        started = datetime.now(timezone.utc)
+        error = None
+        try:
+            await scheduled.job.loop_task()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error = str(e)
+            self.logger.error(f"Loop Job for {job_name}: {error}")
+        finished = datetime.now(timezone.utc)
+
+        try:
+            await crud_jobs.set_job_finished(job_name, finished, error)
+        except Exception as e:
+            self.logger.error(f"{job_name}: job state wasn't saved: {str(e)}")
+
+        if metrics.idle and error is None:
+            return
+        try:
+            await crud_jobs.add_job_run(
+                {
+                    "job_name": job_name,
+                    "run_time": run_time,
+                    "next_run": next_run,
+                    "started": started,
+                    "finished": finished,
+                    "error": error,
+                    "titles": metrics.titles,
+                    "failures": metrics.failures,
+                    "messages": metrics.messages,
+                    "db_time": metrics.db_time,
+                    **metrics.get_mal_latencies(),
+                }
+            )
+        except Exception as e:
+            self.logger.error(f"{job_name}: job run wasn't saved: {str(e)}")
+
+
+scheduler = Scheduler()
@@ -0,0 +1,54 @@
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+
+from app.common.cron import CronExpression
+
+
+class Trigger(ABC):
+    # times are aware UTC datetimes, anchor is scheduled time of the previous run
+    def __init__(self, jitter: float = 0, catch_up: bool = True) -> None:
+        self.jitter = jitter
+        self.catch_up = catch_up
+
+    @abstractmethod
+    def get_next(self, anchor: datetime, moment: datetime) -> datetime:
+        # first run time strictly after moment
+        pass
+
+    @abstractmethod
+    def get_previous(self, anchor: datetime, moment: datetime) -> datetime:
+        # latest run time not after moment
+        pass
+
+
+class IntervalTrigger(Trigger):
+    # fixed rate: runs stay on the grid of the anchor whatever runs take
+    def __init__(self, seconds: float, jitter: float = 0, catch_up: bool = True):
+        if seconds <= 0:
+            raise ValueError("Interval must be positive")
+        super().__init__(jitter, catch_up)
+        self.interval = timedelta(seconds=seconds)
+
+    def __repr__(self) -> str:
+        return f"IntervalTrigger({self.interval})"
+
+    def get_next(self, anchor: datetime, moment: datetime) -> datetime:
+        return anchor + ((moment - anchor) // self.interval + 1) * self.interval
+
+    def get_previous(self, anchor: datetime, moment: datetime) -> datetime:
+        return anchor + ((moment - anchor) // self.interval) * self.interval
+
+
+class CronTrigger(Trigger):
+    def __init__(self, expression: str, jitter: float = 0, catch_up: bool = True):
+        super().__init__(jitter, catch_up)
+        self.cron = CronExpression(expression)
+
+    def __repr__(self) -> str:
+        return f"CronTrigger({self.cron.expression!r})"
+
+    def get_next(self, anchor: datetime, moment: datetime) -> datetime:
+        return self.cron.get_next(moment)
+
+    def get_previous(self, anchor: datetime, moment: datetime) -> datetime:
+        return self.cron.get_previous(moment)
@@ -7,11 +7,22 @@ COMMANDS_TG = [
 ]
 
 COMMANDS_BOT = [
-    {"description": "Anime actions", "command": "/anime"},
+    {
+        "description": "Anime actions (all, airing, finished, upcoming)",
+        "command": "/anime",
+    },
+    {"description": "Anime trends (24h, 7d, 30d)", "command": "/anime_stats 7d"},
+    {
+        "description": "Anime top movers (rank, mean, users)",
+        "command": "/anime_top rank",
+    },
+    {"description": "Anime forecast", "command": "/anime_forecast"},
     {
         "description": "Admin:",
         "subcommands": [
-            {"description": "Reload secrets", "command": "/secrets_reload"}
+            {"description": "Reload secrets", "command": "/secrets_reload"},
+            {"description": "MAL client status", "command": "/mal_status"},
+            {"description": "Recent job runs (anime, partitions)", "command": "/jobs"},
         ],
     },
 ]
@@ -2,14 +2,48 @@ from contextlib import suppress
 
 from aiogram import Router, types
 from aiogram.exceptions import TelegramBadRequest
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 
 from app.common.config import cfg
 from app.common.utils import get_logger, levelDEBUG, levelINFO
+from app.crud import jobs as crud_jobs
+from app.externals.myanimelist import mal_client
 
 router = Router()
 logger = get_logger(levelDEBUG if cfg.ENV == "dev" else levelINFO)
 
+JOB_RUNS_LIMIT = 10
+JOB_ERROR_LENGTH = 200
+
+
+def format_seconds(value: float | None) -> str:
+    return "-" if value is None else f"{value:.2f} s"
+
+
+def format_job_run(job_run: crud_jobs.JobRunRecord) -> str:
+    duration = (job_run.finished - job_run.started).total_seconds()
+    run_text = (
+        f"{job_run.job_name} {job_run.started.strftime('%m-%d %H:%M:%S')}, "
+        f"{format_seconds(duration)}"
+    )
+    # share of the interval, runs close to 100% start to overlap
+    if job_run.next_run:
+        interval = (job_run.next_run - job_run.run_time).total_seconds()
+        if interval > 0:
+            run_text += f" ({duration / interval:.0%} of interval)"
+    if job_run.titles:
+        run_text += (
+            f"\nTitles: {job_run.titles}, failed: {job_run.failures}, "
+            f"messages: {job_run.messages}"
+            f"\nMAL p50: {format_seconds(job_run.mal_p50)}, "
+            f"p95: {format_seconds(job_run.mal_p95)}, "
+            f"max: {format_seconds(job_run.mal_max)}"
+        )
+    run_text += f"\nDB: {format_seconds(job_run.db_time)}"
+    if job_run.error:
+        run_text += f"\nError: {job_run.error[:JOB_ERROR_LENGTH]}"
+    return run_text
+
 
 @router.message(Command("secrets_reload"))
 async def secrets_reload_handler(message: types.Message):
@@ -32,3 +66,36 @@ async def secrets_reload_handler(message: types.Message):
     logger.info("Secrets were reloaded")
     with suppress(TelegramBadRequest):
         await message.answer(text="Reloaded")
+
+
+@router.message(Command("mal_status"))
+async def mal_status_handler(message: types.Message):
+    mal_status = mal_client.get_status()
+    breaker = mal_status["breaker"]
+
+    message_text = f"MAL circuit: {breaker['state']}"
+    if breaker["retry_in"] is not None:
+        message_text += f" (probe in {int(breaker['retry_in'])} s)"
+    message_text += f"\nConsecutive failures: {breaker['failures']}"
+    message_text += f"\nTimes opened: {breaker['opened_count']}"
+    for key, value in mal_status["stats"].items():
+        message_text += f"\n{key.replace('_', ' ').capitalize()}: {value}"
+    message_text += f"\nCached: {mal_status['cache']['size']}"
+    message_text += f"\nIn flight: {mal_status['cache']['inflight']}"
+
+    with suppress(TelegramBadRequest):
+        await message.answer(text=message_text)
+
+
+@router.message(Command("jobs"))
+async def jobs_handler(message: types.Message, command: CommandObject):
+    # job names are capitalized, /jobs anime shows runs of Anime
+    job_name = command.args.strip().capitalize() if command.args else None
+    job_runs = await crud_jobs.get_job_runs(JOB_RUNS_LIMIT, job_name)
+    message_text = (
+        "\n\n".join(format_job_run(job_run) for job_run in job_runs)
+        if job_runs
+        else "No job runs yet"
+    )
+    with suppress(TelegramBadRequest):
+        await message.answer(text=message_text)
@@ -1,50 +1,233 @@
+import math
 from contextlib import suppress
 from copy import copy
-from datetime import datetime, timedelta
+from typing import Any
 
 from aiogram import Bot, F, Router, types
 from aiogram.exceptions import TelegramBadRequest
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
-from aiogram.utils import formatting
+from aiogram.types import InlineKeyboardMarkup
 
+from app.analytics.charts import CHART_RANGES, chart_renderer
+from app.analytics.forecast import FORECAST_HORIZONS_DAYS, get_forecast
 from app.common.config import cfg
-from app.common.utils import get_logger, levelDEBUG, levelINFO
+from app.common.utils import (
+    get_logger,
+    get_message_chunks,
+    get_period,
+    levelDEBUG,
+    levelINFO,
+)
 from app.crud import anime as crud_anime
-from app.db.common import get_model_dict
+from app.crud import stats as crud_stats
 from app.externals.myanimelist import get_anime_info
 from app.telegram.utils.callbacks import (
     CallbackAnimeAction,
     CallbackAnimeAdd,
+    CallbackAnimeChart,
     CallbackAnimeChoose,
+    CallbackAnimeEnd,
+    CallbackAnimePage,
 )
+from app.telegram.utils.cards import drop_anime_card, get_anime_card
+from app.telegram.utils.diff import render_snapshot_diff
 from app.telegram.utils.forms import FormAnimeAdd, FormAnimeRename
 from app.telegram.utils.keyboards import (
+    ANIME_STATUS_FILTERS,
+    get_anime_page_slice,
+    get_anime_pages_count,
     get_keyboard_abort,
-    get_keyboard_anime,
-    get_keyboard_anime_actions,
     get_keyboard_anime_add,
+    get_keyboard_anime_chart,
+    get_keyboard_anime_end,
+    get_keyboard_anime_page,
 )
 
 router = Router()
 logger = get_logger(levelDEBUG if cfg.ENV == "dev" else levelINFO)
 
+TOP_MOVERS_LIMIT = 10
+
+# rendered menu pages, dropped as a whole once catalog version changes
+_anime_pages: dict[str, Any] = {"version": None, "pages": {}}
+
+
+async def get_anime_page(page: int, status: str) -> tuple[str, InlineKeyboardMarkup]:
+    # version is taken before reading, page built from older data isn't kept long
+    version = crud_anime.anime_cache.catalog_version
+    if _anime_pages["version"] != version:
+        _anime_pages["version"] = version
+        _anime_pages["pages"] = {}
+
+    anime_page = _anime_pages["pages"].get((page, status))
+    if anime_page is None:
+        all_anime = await crud_anime.get_all_anime(ANIME_STATUS_FILTERS[status])
+        page = max(0, min(page, get_anime_pages_count(len(all_anime)) - 1))
+
+        main_keyboard = get_keyboard_anime_page(all_anime, page, status)
+        add_keyboard = get_keyboard_anime_add()
+        main_keyboard.attach(add_keyboard)
+        end_keyboard = get_keyboard_anime_end(page, status)
+        main_keyboard.attach(end_keyboard)
+
+        message_text = "Anime:" if status == "all" else f"Anime ({status}):"
+        if not all_anime:
+            message_text += " no titles"
+        anime_page = (message_text, main_keyboard.as_markup())
+        _anime_pages["pages"][(page, status)] = anime_page
+    return anime_page
+
 
 @router.message(Command("anime"))
-async def anime_handler(message: types.Message):
-    all_anime = await crud_anime.get_all_anime()
+async def anime_handler(message: types.Message, command: CommandObject):
+    status = (command.args or "all").strip().lower()
+    if status not in ANIME_STATUS_FILTERS:
+        with suppress(TelegramBadRequest):
+            await message.answer(
+                text=f"Filter must be one of: {', '.join(ANIME_STATUS_FILTERS)}"
+            )
+        return
+
+    message_text, reply_markup = await get_anime_page(0, status)
+    with suppress(TelegramBadRequest):
+        await message.answer(text=message_text, reply_markup=reply_markup)
 
-    main_keyboard = get_keyboard_anime(all_anime)
-    main_keyboard.adjust(1)
 
-    add_keyboard = get_keyboard_anime_add()
-    main_keyboard.attach(add_keyboard)
+@router.callback_query(CallbackAnimePage.filter())
+async def anime_page_handler(
+    callback: types.CallbackQuery, callback_data: CallbackAnimePage
+):
+    if callback_data.status not in ANIME_STATUS_FILTERS:
+        return
+    message_text, reply_markup = await get_anime_page(
+        callback_data.page, callback_data.status
+    )
+    with suppress(TelegramBadRequest):
+        await callback.message.edit_text(text=message_text, reply_markup=reply_markup)
 
-    abort_keyboard = get_keyboard_abort("anime", "End")
-    main_keyboard.attach(abort_keyboard)
 
+@router.callback_query(CallbackAnimeEnd.filter())
+async def anime_end_handler(
+    callback: types.CallbackQuery, callback_data: CallbackAnimeEnd, state: FSMContext
+):
+    # menu is closed with titles of the page it was left on, one page always
+    # fits into a message unlike the whole watchlist
+    await state.clear()
+    status = callback_data.status
+    all_anime = await crud_anime.get_all_anime(ANIME_STATUS_FILTERS.get(status))
+    pages_count = get_anime_pages_count(len(all_anime))
+    page = max(0, min(callback_data.page, pages_count - 1))
+
+    message_text = "Anime:" if status == "all" else f"Anime ({status}):"
+    if all_anime:
+        if pages_count > 1:
+            message_text = f"{message_text[:-1]} {page + 1}/{pages_count}:"
+        for anime in get_anime_page_slice(all_anime, page):
+            message_text += f"\n● {anime.name}"
+    else:
+        message_text += " no titles"
     with suppress(TelegramBadRequest):
-        await message.answer(text="Anime:", reply_markup=main_keyboard.as_markup())
+        await callback.message.edit_text(text=message_text, reply_markup=None)
+
+
+@router.message(Command("anime_stats"))
+async def anime_stats_handler(message: types.Message, command: CommandObject):
+    period_text = (command.args or "7d").strip()
+    period = get_period(period_text)
+    if not period:
+        with suppress(TelegramBadRequest):
+            await message.answer(text="Period must look like 24h, 7d or 4w")
+        return
+
+    all_trends = await crud_stats.get_anime_trends(period)
+    lines = [f"Anime trends for {period_text}:"]
+    if not all_trends:
+        lines.append("no data")
+    for trend in all_trends:
+        lines.append(f"\n● {trend.anime_name}")
+        if trend.rank is not None:
+            rank_delta = trend.rank_delta or 0
+            lines.append(f"Rank: {trend.rank:,} ({rank_delta:+,})".replace(",", " "))
+        lines.append(f"Mean: {trend.mean} ({trend.mean_delta:+.3f})")
+        if trend.users_growth is not None:
+            lines.append(
+                f"Users all: {trend.users_all:,}".replace(",", " ")
+                + f" ({trend.users_growth:+.2f}%)"
+            )
+        if trend.scored_ratio_delta is not None:
+            lines.append(f"Scored ratio: {trend.scored_ratio_delta:+.2f} pp")
+        covered = trend.covered
+        lines.append(f"Covered: {covered.days} d, {covered.seconds // 3600} h")
+
+    for chunk in get_message_chunks(lines):
+        with suppress(TelegramBadRequest):
+            await message.answer(text=chunk)
+
+
+@router.message(Command("anime_top"))
+async def anime_top_handler(message: types.Message, command: CommandObject):
+    order = (command.args or "rank").strip().lower()
+    if order not in crud_stats.TOP_MOVERS_PLACES:
+        with suppress(TelegramBadRequest):
+            await message.answer(
+                text=f"Order must be one of: {', '.join(crud_stats.TOP_MOVERS_PLACES)}"
+            )
+        return
+
+    top_movers = await crud_stats.get_top_movers(order, TOP_MOVERS_LIMIT)
+    lines = [f"Top movers by {order} for 7d:"]
+    if not top_movers:
+        lines.append("no data")
+    for mover in top_movers:
+        if order == "rank":
+            if mover.rank_climb is None:
+                continue
+            value = f"rank {mover.rank:,} ({mover.rank_climb:+,})"
+        elif order == "mean":
+            value = f"mean {mover.mean} ({mover.mean_delta:+.3f})"
+        else:
+            if mover.users_growth is None:
+                continue
+            value = f"users {mover.users_all:,} ({mover.users_growth:+.2f}%)"
+        lines.append(
+            f"{getattr(mover, order + '_place')}. {mover.anime_name}: "
+            + value.replace(",", " ")
+        )
+    if top_movers:
+        lines.append(f"\nRefreshed: {top_movers[0].refreshed:%Y-%m-%d %H:%M:%S}")
+
+    for chunk in get_message_chunks(lines):
+        with suppress(TelegramBadRequest):
+            await message.answer(text=chunk)
+
+
+@router.message(Command("anime_forecast"))
+async def anime_forecast_handler(message: types.Message):
+    all_forecast = await get_forecast()
+    lines = ["Anime forecast:"]
+    if not all_forecast:
+        lines.append("no data")
+    for anime_forecast in all_forecast:
+        lines.append(f"\n● {anime_forecast['anime_name']}")
+        for field in ("users_all", "users_scored", "rank"):
+            rate = anime_forecast[f"{field}_rate"]
+            if math.isnan(rate):
+                continue
+            projections = [
+                f"{horizon}d: "
+                + f"{round(anime_forecast[f'{field}_{horizon}d']):,}".replace(",", " ")
+                for horizon in FORECAST_HORIZONS_DAYS
+            ]
+            rate_str = f"{rate:+,.1f}".replace(",", " ")
+            lines.append(
+                f"{field.replace('_', ' ').capitalize()}: {rate_str}/d, "
+                + ", ".join(projections)
+            )
+
+    for chunk in get_message_chunks(lines):
+        with suppress(TelegramBadRequest):
+            await message.answer(text=chunk)
 
 
 @router.callback_query(CallbackAnimeAdd.filter())
@@ -95,8 +278,7 @@ async def anime_add_id_form(
         await message.answer(text="Wrong MAL anime id given")
         return
 
-    last_info = await crud_anime.get_last_info(anime_id)
-    if last_info:
+    if await crud_anime.get_anime(anime_id):
         await state.clear()
         await message.answer(text="Anime exists")
         return
@@ -134,7 +316,7 @@ async def anime_add_name_form(
         await message.answer(text="No anime data was given from MAL, aborted")
         return
 
-    await crud_anime.add_anime_info(
+    await crud_anime.add_anime(
         id=anime_id,
         name=anime_name,
         rank=anime_info["rank"],
@@ -151,37 +333,18 @@ async def anime_add_name_form(
 async def anime_info_handler(
     callback: types.CallbackQuery, callback_data: CallbackAnimeChoose
 ):
-    anime_id = callback_data.id
-    anime_info = get_model_dict(await crud_anime.get_last_info(anime_id))
+    anime_info = await crud_anime.get_last_info(callback_data.id)
+    anime = await crud_anime.get_catalog_anime(callback_data.id)
     with suppress(TelegramBadRequest):
-        message_info = [formatting.Bold(f"{anime_info['anime_name']}: \n")]
-        for key in ("rank", "mean", "users_all", "users_scored", "status", "updated"):
-            value = anime_info[key]
-            if isinstance(value, str):
-                info_str = value
-            elif isinstance(value, datetime):
-                info_str = value.strftime("%Y-%m-%d %H:%M:%S")
-            elif value == None:
-                info_str = "-"
-            else:
-                info_str = "{:,}".format(value).replace(",", " ")
-
-            message_info.extend(
-                [
-                    formatting.Bold(f"{key.replace('_', ' ').capitalize()}:   "),
-                    f" {info_str}\n",
-                ]
-            )
-        message_text, message_entities = formatting.Text(*message_info).render()
-        abort_keyboard = get_keyboard_abort("anime_i", "End")
-        actions_keyboard = get_keyboard_anime_actions(anime_id)
-        actions_keyboard.adjust(2)
-        actions_keyboard.attach(abort_keyboard)
-
+        if not anime_info or not anime:
+            await callback.message.edit_text(text="Anime not found", reply_markup=None)
+            return
+        # cached card is reused until snapshot, name or tracking of the title changes
+        anime_card = get_anime_card(anime_info, anime.tracked)
         await callback.message.edit_text(
-            text=message_text,
-            entities=message_entities,
-            reply_markup=actions_keyboard.as_markup(),
+            text=anime_card.text,
+            entities=anime_card.entities,
+            reply_markup=anime_card.reply_markup,
         )
 
 
@@ -190,9 +353,9 @@ async def anime_update_handler(
     callback: types.CallbackQuery, callback_data: CallbackAnimeAction
 ):
     anime_id = callback_data.id
-    anime_info = await get_anime_info(anime_id)
+    anime_info = await get_anime_info(anime_id, force=True)
 
-    if not anime_info:
+    if not anime_info or "error_code" in anime_info:
         with suppress(TelegramBadRequest):
             await callback.message.edit_text(
                 text=callback.message.text + "\nUpdate error",
@@ -201,50 +364,22 @@ async def anime_update_handler(
             )
             return
 
-    last_info = get_model_dict(await crud_anime.get_last_info(anime_id))
-
-    message_info = [formatting.Bold(f"{last_info['anime_name']}: \n")]
-    for key in anime_info.keys():
-        try:
-            diff = anime_info[key] - last_info[key]
-        except Exception:
-            diff = None
-        if isinstance(diff, timedelta):
-            info_str = f"+{diff.days} d, {diff.seconds // 3600} h, {(diff.seconds // 60) % 60} m"
-            diff_str = ""
-        elif diff == None:
-            if last_info[key] == anime_info[key]:
-                info_str = last_info[key]
-            else:
-                info_str = f"{last_info[key]} -> {anime_info[key]}"
-            diff_str = ""
-        else:
-            diff_str = "{:,}".format(round(diff, 3)).replace(",", " ")
-            if diff >= 0:
-                diff_str = "+" + diff_str
-            info_str = "{:,}".format(anime_info[key]).replace(",", " ")
-        message_info.extend(
-            [
-                formatting.Bold(f"{key.replace('_', ' ').capitalize()}:   "),
-                f" {info_str}",
-            ]
-        )
-        if diff_str:
-            message_info.append(formatting.Italic(f" ({diff_str})"))
-        message_info.append("\n")
+    last_info = await crud_anime.get_last_info(anime_id)
 
     await crud_anime.add_anime_info(
         id=anime_id,
-        name=last_info["anime_name"],
         rank=anime_info["rank"],
         mean=anime_info["mean"],
         users_all=anime_info["users_all"],
         users_scored=anime_info["users_scored"],
         status=anime_info["status"],
         updated=anime_info["updated"],
+        last_info=last_info if cfg.ANIME_UPDATE_DEDUP else None,
     )
 
-    message_text, message_entities = formatting.Text(*message_info).render()
+    message_text, message_entities = render_snapshot_diff(
+        last_info.anime_name, last_info, anime_info
+    )
 
     with suppress(TelegramBadRequest):
         await callback.message.edit_text(
@@ -252,6 +387,68 @@ async def anime_update_handler(
         )
 
 
+@router.callback_query(CallbackAnimeAction.filter(F.action == "Chart"))
+async def anime_chart_handler(
+    callback: types.CallbackQuery, callback_data: CallbackAnimeAction
+):
+    with suppress(TelegramBadRequest):
+        abort_keyboard = get_keyboard_abort("anime_i", "End")
+        chart_keyboard = get_keyboard_anime_chart(callback_data.id, list(CHART_RANGES))
+        chart_keyboard.adjust(len(CHART_RANGES))
+        chart_keyboard.attach(abort_keyboard)
+
+        await callback.message.edit_reply_markup(
+            reply_markup=chart_keyboard.as_markup()
+        )
+
+
+@router.callback_query(CallbackAnimeChart.filter())
+async def anime_chart_range_handler(
+    callback: types.CallbackQuery, callback_data: CallbackAnimeChart
+):
+    anime_id = callback_data.id
+    chart_range = callback_data.range
+    last_info = await crud_anime.get_last_info(anime_id)
+    if not last_info or chart_range not in CHART_RANGES:
+        with suppress(TelegramBadRequest):
+            await callback.message.answer(text="No anime data for chart")
+        return
+
+    try:
+        chart = await chart_renderer.get_chart(
+            anime_id, last_info.anime_name, chart_range, last_info.last_seen
+        )
+    except Exception as e:
+        logger.error(f"Chart for anime {anime_id} failed: {str(e)}")
+        chart = None
+    with suppress(TelegramBadRequest):
+        if not chart:
+            await callback.message.answer(text="Chart wasn't rendered")
+            return
+        await callback.message.answer_photo(
+            photo=types.BufferedInputFile(chart, f"anime_{anime_id}_{chart_range}.png"),
+            caption=f"{last_info.anime_name}: {chart_range}",
+        )
+
+
+@router.callback_query(CallbackAnimeAction.filter(F.action.in_({"Pause", "Resume"})))
+async def anime_tracking_handler(
+    callback: types.CallbackQuery, callback_data: CallbackAnimeAction
+):
+    tracked = callback_data.action == "Resume"
+    await crud_anime.set_tracked(callback_data.id, tracked)
+    anime_info = await crud_anime.get_last_info(callback_data.id)
+    with suppress(TelegramBadRequest):
+        if not anime_info:
+            await callback.message.edit_text(text="Anime not found", reply_markup=None)
+            return
+        anime_card = get_anime_card(anime_info, tracked)
+        await callback.message.edit_reply_markup(reply_markup=anime_card.reply_markup)
+        await callback.answer(
+            text="Refresh resumed" if tracked else "Refresh paused, history is kept"
+        )
+
+
 @router.callback_query(CallbackAnimeAction.filter(F.action == "Rename"))
 async def anime_rename_handler(
     callback: types.CallbackQuery, callback_data: CallbackAnimeAction, state: FSMContext
@@ -303,4 +500,5 @@ async def anime_delete_handler(
     with suppress(TelegramBadRequest):
         await callback.message.edit_reply_markup(reply_markup=None)
         await crud_anime.delete_anime(callback_data.id)
+        drop_anime_card(callback_data.id)
         await callback.message.answer(text="Anime was deleted")
@@ -8,7 +8,6 @@ from aiogram.fsm.context import FSMContext
 
 from app.common.config import cfg
 from app.common.utils import get_logger, levelDEBUG, levelINFO
-from app.crud import anime as crud_anime
 from app.telegram.commands import COMMANDS_BOT
 from app.telegram.utils.callbacks import CallbackAbort
 
@@ -65,17 +64,6 @@ async def abort_handler(
 
     action = callback_data.action
     action_text = ""
-    if action == "anime":
-        all_anime = await crud_anime.get_all_anime()
-        message_text = "Anime:"
-        if all_anime:
-            for anime in all_anime:
-                message_text += f"\n● {anime['name']}"
-        else:
-            message_text += " no titles"
-        with suppress(TelegramBadRequest):
-            await callback.message.edit_text(text=message_text, reply_markup=None)
-        return
     if action == "anime_a":
         action_text = "Add anime"
     if action == "anime_i":
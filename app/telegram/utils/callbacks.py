@@ -16,6 +16,16 @@ class CallbackAnimeChoose(CallbackData, prefix="anime"):
     id: int
 
 
+class CallbackAnimePage(CallbackData, prefix="anime_page"):
+    page: int
+    status: str
+
+
+class CallbackAnimeEnd(CallbackData, prefix="anime_end"):
+    page: int
+    status: str
+
+
 class CallbackAnimeAdd(CallbackData, prefix="anime_add"):
     pass
 
@@ -23,3 +33,8 @@ class CallbackAnimeAdd(CallbackData, prefix="anime_add"):
 class CallbackAnimeAction(CallbackData, prefix="anime_action"):
     id: int
     action: str
+
+
+class CallbackAnimeChart(CallbackData, prefix="anime_chart"):
+    id: int
+    range: str
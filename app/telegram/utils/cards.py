@@ -0,0 +1,67 @@
+from datetime import datetime
+from typing import NamedTuple
+
+from aiogram.types import InlineKeyboardMarkup, MessageEntity
+from aiogram.utils import formatting
+
+from app.crud.anime import AnimeSnapshot
+from app.telegram.utils.diff import freeze_entities
+from app.telegram.utils.keyboards import get_keyboard_abort, get_keyboard_anime_actions
+
+CARD_FIELDS = ("rank", "mean", "users_all", "users_scored", "status", "updated")
+
+
+class AnimeCard(NamedTuple):
+    text: str
+    entities: list[MessageEntity]
+    reply_markup: InlineKeyboardMarkup
+
+
+# one card per title, new snapshot, check time, name or tracking gives another key
+_anime_cards: dict[int, tuple[tuple[int, datetime, str, bool], AnimeCard]] = {}
+
+
+def render_anime_card(anime_info: AnimeSnapshot, tracked: bool) -> AnimeCard:
+    message_info = [formatting.Bold(f"{anime_info.anime_name}: \n")]
+    for key in CARD_FIELDS:
+        # unchanged snapshots keep the time of the latest check in last_seen
+        value = getattr(anime_info, "last_seen" if key == "updated" else key)
+        if isinstance(value, str):
+            info_str = value
+        elif isinstance(value, datetime):
+            info_str = value.strftime("%Y-%m-%d %H:%M:%S")
+        elif value == None:
+            info_str = "-"
+        else:
+            info_str = "{:,}".format(value).replace(",", " ")
+
+        message_info.extend(
+            [
+                formatting.Bold(f"{key.replace('_', ' ').capitalize()}:   "),
+                f" {info_str}\n",
+            ]
+        )
+    message_text, message_entities = formatting.Text(*message_info).render()
+    abort_keyboard = get_keyboard_abort("anime_i", "End")
+    actions_keyboard = get_keyboard_anime_actions(anime_info.anime_id, tracked)
+    actions_keyboard.adjust(2)
+    actions_keyboard.attach(abort_keyboard)
+    return AnimeCard(
+        message_text, freeze_entities(message_entities), actions_keyboard.as_markup()
+    )
+
+
+def get_anime_card(anime_info: AnimeSnapshot, tracked: bool) -> AnimeCard:
+    key = (anime_info.id, anime_info.last_seen, anime_info.anime_name, tracked)
+    cached = _anime_cards.get(anime_info.anime_id)
+    if cached and cached[0] == key:
+        card = cached[1]
+    else:
+        card = render_anime_card(anime_info, tracked)
+        _anime_cards[anime_info.anime_id] = (key, card)
+    # keyboard models are mutable, cached one is never handed out
+    return card._replace(reply_markup=card.reply_markup.model_copy(deep=True))
+
+
+def drop_anime_card(anime_id: int) -> None:
+    _anime_cards.pop(anime_id, None)
@@ -0,0 +1,127 @@
+# keep it free of config and database imports, benchmarks load it standalone
+from datetime import datetime, timedelta
+from functools import lru_cache
+from operator import attrgetter
+from typing import Any, Callable, NamedTuple
+
+from aiogram.types import MessageEntity
+from pydantic import ConfigDict
+
+
+class FieldDiff(NamedTuple):
+    info: str
+    diff: str
+
+
+def format_number(value: int | float, sign: bool = False) -> str:
+    return (f"{value:+,}" if sign else f"{value:,}").replace(",", " ")
+
+
+def compare_text(last_value: Any, value: Any) -> FieldDiff:
+    last_str = "-" if last_value is None else str(last_value)
+    if last_value == value:
+        return FieldDiff(last_str, "")
+    return FieldDiff(f"{last_str} -> {'-' if value is None else value}", "")
+
+
+def compare_number(
+    last_value: int | float | None, value: int | float | None
+) -> FieldDiff:
+    # rank of a title may be missing on either side
+    if last_value is None or value is None:
+        return compare_text(last_value, value)
+    return FieldDiff(
+        format_number(value), format_number(round(value - last_value, 3), sign=True)
+    )
+
+
+def compare_time(last_value: datetime, value: datetime) -> FieldDiff:
+    diff: timedelta = value - last_value
+    return FieldDiff(
+        f"+{diff.days} d, {diff.seconds // 3600} h, {(diff.seconds // 60) % 60} m", ""
+    )
+
+
+class SnapshotField(NamedTuple):
+    key: str
+    get_last_value: Callable[[Any], Any]
+    compare: Callable[[Any, Any], FieldDiff]
+    label: str
+    label_length: int
+
+
+def get_text_length(text: str) -> int:
+    # telegram counts entity offsets in utf-16 code units
+    return len(text) if text.isascii() else len(text.encode("utf-16-le")) // 2
+
+
+class FrozenMessageEntity(MessageEntity):
+    # aiogram entities are mutable, frozen ones can be shared between messages
+    model_config = ConfigDict(frozen=True)
+
+
+def freeze_entities(entities: list[MessageEntity]) -> list[FrozenMessageEntity]:
+    return [
+        FrozenMessageEntity(**entity.model_dump(exclude_none=True))
+        for entity in entities
+    ]
+
+
+@lru_cache(maxsize=4096)
+def get_entity(entity_type: str, offset: int, length: int) -> FrozenMessageEntity:
+    return FrozenMessageEntity(type=entity_type, offset=offset, length=length)
+
+
+def get_snapshot_field(
+    key: str, compare: Callable[[Any, Any], FieldDiff], last_key: str | None = None
+) -> SnapshotField:
+    label = f"{key.replace('_', ' ').capitalize()}:   "
+    return SnapshotField(
+        key, attrgetter(last_key or key), compare, label, get_text_length(label)
+    )
+
+
+SNAPSHOT_FIELDS = (
+    get_snapshot_field("rank", compare_number),
+    get_snapshot_field("mean", compare_number),
+    get_snapshot_field("users_all", compare_number),
+    get_snapshot_field("users_scored", compare_number),
+    get_snapshot_field("status", compare_text),
+    # previous check of unchanged snapshot is stored in last_seen
+    get_snapshot_field("updated", compare_time, "last_seen"),
+)
+
+
+def get_snapshot_diff(
+    last_info: Any, anime_info: dict[str, Any]
+) -> list[tuple[SnapshotField, FieldDiff]]:
+    return [
+        (field, field.compare(field.get_last_value(last_info), anime_info[field.key]))
+        for field in SNAPSHOT_FIELDS
+    ]
+
+
+def render_snapshot_diff(
+    anime_name: str, last_info: Any, anime_info: dict[str, Any]
+) -> tuple[str, list[MessageEntity]]:
+    # same text and entities as bold labels and italic diffs of aiogram formatting,
+    # offsets are counted here instead of walking a tree of nodes
+    header = f"{anime_name}: \n"
+    offset = get_text_length(header)
+    parts = [header]
+    entities = [get_entity("bold", 0, offset)]
+    for field, field_diff in get_snapshot_diff(last_info, anime_info):
+        entities.append(get_entity("bold", offset, field.label_length))
+        info = f" {field_diff.info}"
+        parts.append(field.label)
+        parts.append(info)
+        offset += field.label_length + get_text_length(info)
+        if field_diff.diff:
+            diff = f" ({field_diff.diff})"
+            diff_length = get_text_length(diff)
+            entities.append(get_entity("italic", offset, diff_length))
+            parts.append(diff)
+            offset += diff_length
+        parts.append("\n")
+        offset += 1
+    return "".join(parts), entities
@@ -1,12 +1,27 @@
+import math
+
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
+from app.crud.anime import AnimeRecord
 from app.telegram.utils.callbacks import (
     CallbackAbort,
     CallbackAnimeAction,
     CallbackAnimeAdd,
+    CallbackAnimeChart,
     CallbackAnimeChoose,
+    CallbackAnimeEnd,
+    CallbackAnimePage,
 )
 
+ANIME_PAGE_SIZE = 10
+# filter name -> MAL status of the latest snapshot
+ANIME_STATUS_FILTERS = {
+    "all": None,
+    "airing": "currently_airing",
+    "finished": "finished_airing",
+    "upcoming": "not_yet_aired",
+}
+
 
 def get_keyboard_abort(action: str, name: str = "Abort") -> InlineKeyboardBuilder:
     keyboard = InlineKeyboardBuilder()
@@ -14,12 +29,67 @@ def get_keyboard_abort(action: str, name: str = "Abort") -> InlineKeyboardBuilde
     return keyboard
 
 
-def get_keyboard_anime(all_anime: list[dict[str, str | int]]) -> InlineKeyboardBuilder:
+def get_keyboard_anime(all_anime: list[AnimeRecord]) -> InlineKeyboardBuilder:
     keyboard = InlineKeyboardBuilder()
     for anime in all_anime:
         keyboard.button(
-            text=anime["name"], callback_data=CallbackAnimeChoose(id=anime["id"])
+            text=anime.name if anime.tracked else f"{anime.name} (paused)",
+            callback_data=CallbackAnimeChoose(id=anime.id),
+        )
+    return keyboard
+
+
+def get_anime_pages_count(anime_count: int) -> int:
+    return max(1, math.ceil(anime_count / ANIME_PAGE_SIZE))
+
+
+def get_keyboard_anime_page(
+    all_anime: list[AnimeRecord], page: int, status: str
+) -> InlineKeyboardBuilder:
+    pages_count = get_anime_pages_count(len(all_anime))
+    keyboard = get_keyboard_anime(get_anime_page_slice(all_anime, page))
+    keyboard.adjust(1)
+
+    if pages_count > 1:
+        pages_keyboard = InlineKeyboardBuilder()
+        pages_keyboard.button(
+            text="<",
+            callback_data=CallbackAnimePage(
+                page=(page - 1) % pages_count, status=status
+            ),
+        )
+        pages_keyboard.button(
+            text=f"{page + 1}/{pages_count}",
+            callback_data=CallbackAnimePage(page=page, status=status),
+        )
+        pages_keyboard.button(
+            text=">",
+            callback_data=CallbackAnimePage(
+                page=(page + 1) % pages_count, status=status
+            ),
+        )
+        keyboard.attach(pages_keyboard)
+
+    filters_keyboard = InlineKeyboardBuilder()
+    for status_filter in ANIME_STATUS_FILTERS:
+        filters_keyboard.button(
+            text=f"[{status_filter}]" if status_filter == status else status_filter,
+            callback_data=CallbackAnimePage(page=0, status=status_filter),
         )
+    keyboard.attach(filters_keyboard)
+    return keyboard
+
+
+def get_anime_page_slice(all_anime: list[AnimeRecord], page: int) -> list[AnimeRecord]:
+    page_start = page * ANIME_PAGE_SIZE
+    return all_anime[page_start : page_start + ANIME_PAGE_SIZE]
+
+
+def get_keyboard_anime_end(page: int, status: str) -> InlineKeyboardBuilder:
+    keyboard = InlineKeyboardBuilder()
+    keyboard.button(
+        text="End", callback_data=CallbackAnimeEnd(page=page, status=status)
+    )
     return keyboard
 
 
@@ -30,10 +100,21 @@ def get_keyboard_anime_add() -> InlineKeyboardBuilder:
     return keyboard
 
 
-def get_keyboard_anime_actions(id: int) -> InlineKeyboardBuilder:
+def get_keyboard_anime_actions(id: int, tracked: bool) -> InlineKeyboardBuilder:
     keyboard = InlineKeyboardBuilder()
-    for action in ("Update", "Rename", "Delete"):
+    # paused titles aren't refreshed by the job
+    track_action = "Pause" if tracked else "Resume"
+    for action in ("Update", "Chart", track_action, "Rename", "Delete"):
         keyboard.button(
             text=action, callback_data=CallbackAnimeAction(id=id, action=action)
         )
     return keyboard
+
+
+def get_keyboard_anime_chart(id: int, ranges: list[str]) -> InlineKeyboardBuilder:
+    keyboard = InlineKeyboardBuilder()
+    for chart_range in ranges:
+        keyboard.button(
+            text=chart_range, callback_data=CallbackAnimeChart(id=id, range=chart_range)
+        )
+    return keyboard
@@ -0,0 +1,107 @@
+# per-title cost of snapshot diff formatting done by anime job
+# run from repository root: python -m benchmarks.bench_diff [titles] [repeat]
+import random
+import sys
+import timeit
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+
+from aiogram.utils import formatting
+
+from app.telegram.utils.diff import get_snapshot_diff, render_snapshot_diff
+
+# same layout as app.crud.anime.AnimeSnapshot, crud is not imported
+# to keep config and database out of the benchmark
+Snapshot = namedtuple(
+    "Snapshot",
+    "id anime_id rank mean users_all users_scored status updated last_seen anime_name",
+)
+
+
+def get_samples(titles: int) -> list[tuple[Snapshot, dict]]:
+    now = datetime.now(timezone.utc)
+    samples = []
+    for index in range(titles):
+        last_seen = now - timedelta(hours=random.randint(1, 48))
+        last_info = Snapshot(
+            id=index,
+            anime_id=index,
+            rank=random.choice((None, random.randint(1, 20000))),
+            mean=round(random.uniform(5, 9), 2),
+            users_all=random.randint(1000, 4_000_000),
+            users_scored=random.randint(100, 2_000_000),
+            status="currently_airing",
+            updated=last_seen,
+            last_seen=last_seen,
+            anime_name=f"Anime {index}",
+        )
+        anime_info = {
+            "rank": last_info.rank and last_info.rank + random.randint(-50, 50),
+            "mean": round(last_info.mean + random.uniform(-0.05, 0.05), 2),
+            "users_all": last_info.users_all + random.randint(0, 5000),
+            "users_scored": last_info.users_scored + random.randint(0, 2000),
+            "status": random.choice(("currently_airing", "finished_airing")),
+            "updated": now,
+        }
+        samples.append((last_info, anime_info))
+    return samples
+
+
+def render_legacy(last_info: Snapshot, anime_info: dict) -> formatting.Text:
+    # loop which was copied between job and update handler, kept as a baseline
+    message_info = [formatting.Bold(f"{last_info.anime_name}: \n")]
+    for key in anime_info.keys():
+        last_value = getattr(last_info, "last_seen" if key == "updated" else key)
+        try:
+            diff = anime_info[key] - last_value
+        except Exception:
+            diff = None
+        if isinstance(diff, timedelta):
+            info_str = f"+{diff.days} d, {diff.seconds // 3600} h, {(diff.seconds // 60) % 60} m"
+            diff_str = ""
+        elif diff == None:
+            if last_value == anime_info[key]:
+                info_str = last_value
+            else:
+                info_str = f"{last_value} -> {anime_info[key]}"
+            diff_str = ""
+        else:
+            diff_str = "{:,}".format(round(diff, 3)).replace(",", " ")
+            if diff >= 0:
+                diff_str = "+" + diff_str
+            info_str = "{:,}".format(anime_info[key]).replace(",", " ")
+        message_info.extend(
+            [
+                formatting.Bold(f"{key.replace('_', ' ').capitalize()}:   "),
+                f" {info_str}",
+            ]
+        )
+        if diff_str:
+            message_info.append(formatting.Italic(f" ({diff_str})"))
+        message_info.append("\n")
+    return formatting.Text(*message_info)
+
+
+def main() -> None:
+    titles = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    random.seed(0)
+    samples = get_samples(titles)
+
+    cases = {
+        "diff": lambda: [get_snapshot_diff(*sample) for sample in samples],
+        "diff + render": lambda: [
+            render_snapshot_diff(sample[0].anime_name, *sample) for sample in samples
+        ],
+        "legacy + render": lambda: [
+            render_legacy(*sample).render() for sample in samples
+        ],
+    }
+    print(f"{titles} titles, best of {repeat}")
+    for name, case in cases.items():
+        best = min(timeit.repeat(case, number=1, repeat=repeat))
+        print(f"{name:<16} {best / titles * 1e6:8.2f} us/title")
+
+
+if __name__ == "__main__":
+    main()